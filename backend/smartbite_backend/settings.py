@@ -37,6 +37,53 @@ ALLOWED_HOSTS = ['127.0.0.1', 'localhost', '10.0.2.2']
 # USDA Food Database API Key
 USDA_API_KEY = os.getenv('USDA_API_KEY')  # Get API key from environment variable
 
+# USDA FoodData Central API endpoint and HTTP connection pool
+USDA_API_BASE_URL = os.getenv('USDA_API_BASE_URL', 'https://api.nal.usda.gov/fdc/v1')
+USDA_HTTP_POOL_SIZE = int(os.getenv('USDA_HTTP_POOL_SIZE', 10))  # Connections kept alive per process
+USDA_HTTP_CONNECT_TIMEOUT = float(os.getenv('USDA_HTTP_CONNECT_TIMEOUT', 3.05))
+USDA_HTTP_READ_TIMEOUT = float(os.getenv('USDA_HTTP_READ_TIMEOUT', 10))
+# Connections per event loop for the async views; further in-flight calls wait on the pool
+# as coroutines, and httpcore's bookkeeping grows with the square of the pool size
+USDA_ASYNC_POOL_SIZE = int(os.getenv('USDA_ASYNC_POOL_SIZE', 32))
+
+# How long (in seconds) locally stored USDA food details are served before refetching
+USDA_FOOD_CACHE_TTL = int(os.getenv('USDA_FOOD_CACHE_TTL', 60 * 60 * 24 * 30))
+# How long past that TTL stored details are still served while a background refresh runs,
+# including when USDA is failing; older details are refetched before being returned
+USDA_FOOD_MAX_STALENESS = int(os.getenv('USDA_FOOD_MAX_STALENESS', 60 * 60 * 24 * 7))
+USDA_REFRESH_WORKERS = int(os.getenv('USDA_REFRESH_WORKERS', 2))  # Background refresh threads per process
+# Most fdc_ids accepted by one /auth/foods/details/batch/ request
+FOOD_DETAILS_BATCH_MAX_IDS = int(os.getenv('FOOD_DETAILS_BATCH_MAX_IDS', 100))
+# Most entries one /auth/food-entries/bulk/ request may create
+FOOD_ENTRIES_BULK_MAX = int(os.getenv('FOOD_ENTRIES_BULK_MAX', 50))
+# Days tombstones of deleted entries are kept for delta sync (`manage.py prune_food_entry_tombstones`);
+# clients that have not synced for longer must do a full sync
+FOOD_SYNC_TOMBSTONE_DAYS = int(os.getenv('FOOD_SYNC_TOMBSTONE_DAYS', 90))
+# Most days one /auth/food-entries/range/ request may span
+FOOD_ENTRIES_RANGE_MAX_DAYS = int(os.getenv('FOOD_ENTRIES_RANGE_MAX_DAYS', 31))
+# Longest range /auth/food-entries/trends/ covers, and the most points it returns; longer
+# ranges are grouped into weeks or months to stay under the limit
+FOOD_TRENDS_MAX_DAYS = int(os.getenv('FOOD_TRENDS_MAX_DAYS', 366))
+FOOD_TRENDS_MAX_POINTS = int(os.getenv('FOOD_TRENDS_MAX_POINTS', 100))
+
+# USDA search result cache: a per-process LRU in front of the shared Django cache
+USDA_SEARCH_CACHE_TTL = int(os.getenv('USDA_SEARCH_CACHE_TTL', 60 * 60 * 6))
+USDA_SEARCH_LRU_SIZE = int(os.getenv('USDA_SEARCH_LRU_SIZE', 1024))
+
+# Primary food search path: 'usda' queries the USDA API, 'local' searches the imported
+# FoodItem catalog first and only falls back to USDA when it has no matches
+FOOD_SEARCH_BACKEND = os.getenv('FOOD_SEARCH_BACKEND', 'usda')
+
+# Autocomplete prefix index: how often (in seconds) each worker picks up changed catalog
+# rows, and how often it rebuilds from scratch to refresh popularity weights
+AUTOCOMPLETE_SYNC_INTERVAL = int(os.getenv('AUTOCOMPLETE_SYNC_INTERVAL', 30))
+AUTOCOMPLETE_REBUILD_INTERVAL = int(os.getenv('AUTOCOMPLETE_REBUILD_INTERVAL', 60 * 60))
+
+# Spelling-correction index written by `manage.py build_spelling_index` and loaded by each
+# worker; without the file, workers build it from the catalog in the background and rebuild
+# it when the catalog changes
+SPELLING_INDEX_PATH = os.getenv('SPELLING_INDEX_PATH', str(BASE_DIR / 'spelling_index.pickle'))
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -46,6 +93,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'users',
     'rest_framework',
     'rest_framework.authtoken',
@@ -66,6 +114,8 @@ MIDDLEWARE = [
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
+# Let browser clients read the pagination cursors, spelling hint and diary ETags
+CORS_EXPOSE_HEADERS = ['X-Next-Cursor', 'X-Did-You-Mean', 'ETag']
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
@@ -120,6 +170,18 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Point CACHE_BACKEND/CACHE_LOCATION at Redis or Memcached to share cached data between workers
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -0,0 +1,208 @@
+import json
+import logging
+from functools import wraps
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.authtoken.models import Token
+
+from .cache import MISSING, SharedCallFailed
+from .models import FoodItem
+from .spelling import correct_query
+from .usda import USDA_FOOD_PARAMS, get_async_usda_client
+from .views import (
+    created_food_entry_data,
+    details_flight,
+    details_refresher,
+    fetch_food_details,
+    format_search_results,
+    next_search_cursor,
+    parse_food_details,
+    parse_food_entry_data,
+    parse_search_page,
+    prefetch_search_page,
+    save_food_entry,
+    SEARCH_DATA_TYPES,
+    search_cache,
+    search_cache_key,
+    search_local_page,
+    usda_search_params,
+)
+
+logger = logging.getLogger(__name__)
+
+# Async counterparts of the USDA-backed views. They are meant to be served through
+# smartbite_backend.asgi, where a slow USDA response only parks a coroutine instead
+# of holding a worker thread. DRF's @api_view is sync-only, so token authentication
+# is done here directly.
+
+
+def async_token_required(methods):
+    """Authenticate with a DRF token and restrict the allowed HTTP methods"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse(
+                    {'detail': f'Method "{request.method}" not allowed.'},
+                    status=405
+                )
+            keyword, _, key = request.headers.get('Authorization', '').partition(' ')
+            if keyword != 'Token' or not key.strip():
+                return JsonResponse(
+                    {'detail': 'Authentication credentials were not provided.'},
+                    status=401
+                )
+            try:
+                token = await Token.objects.select_related('user').aget(key=key.strip())
+            except Token.DoesNotExist:
+                return JsonResponse({'detail': 'Invalid token.'}, status=401)
+            if not token.user.is_active:
+                return JsonResponse({'detail': 'User inactive or deleted.'}, status=401)
+            request.user = token.user
+            return await view(request, *args, **kwargs)
+        return csrf_exempt(wrapper)
+    return decorator
+
+
+async def astored_food_details(fdc_id):
+    """Async stored_food_details"""
+    food_item = await FoodItem.objects.filter(fdc_id=fdc_id).defer('usda_payload').afirst()
+    if food_item and food_item.is_fresh():
+        return food_item.to_food_details()
+    return MISSING
+
+
+async def aget_food_details(fdc_id):
+    """Async get_food_details: read through the FoodItem store, then the USDA API"""
+    fdc_id = str(fdc_id)
+    food_item = await FoodItem.objects.filter(fdc_id=fdc_id).defer('usda_payload').afirst()
+    if food_item and food_item.is_fresh():
+        return food_item.to_food_details()
+    if food_item and food_item.is_servable():
+        details_refresher.submit(fdc_id, lambda: fetch_food_details(fdc_id))
+        return food_item.to_food_details()
+    return await afetch_food_details(fdc_id)
+
+
+async def afetch_food_details(fdc_id):
+    """Async fetch_food_details: concurrent lookups of a food share one USDA request"""
+    try:
+        return await details_flight.ado(
+            fdc_id,
+            lambda: afetch_and_store_food_details(fdc_id),
+            lookup=lambda: astored_food_details(fdc_id)
+        )
+    except SharedCallFailed as e:
+        logging.error(f"Error fetching food details: {e}")
+        return None
+
+
+async def afetch_and_store_food_details(fdc_id):
+    """Async fetch_and_store_food_details"""
+    try:
+        response = await get_async_usda_client().get(f"/food/{fdc_id}", params=USDA_FOOD_PARAMS)
+        data = response.json()
+    except httpx.HTTPError as e:
+        logging.error(f"Error fetching food details: {e}")
+        return None
+
+    food_details = parse_food_details(data)
+    try:
+        await sync_to_async(FoodItem.store_usda_food)(fdc_id, food_details, data)
+    except Exception as e:
+        logging.error(f"Error storing food details for {fdc_id}: {e}")
+    return food_details
+
+
+async def asearch_usda_foods(query, data_types, page, page_size):
+    """Async search_usda_foods"""
+    params = usda_search_params(query, data_types, page, page_size)
+    try:
+        response = await get_async_usda_client().get("/foods/search", params=params)
+    except httpx.HTTPError as e:
+        logging.error(f"USDA API request failed: {str(e)}")
+        logging.error(f"Request params: {params}")
+        raise
+    return format_search_results(query, response.json())
+
+
+@async_token_required(['GET'])
+async def search_foods_async(request):
+    """Search foods without blocking a worker thread; same backends and cursors as search_foods"""
+    query = request.GET.get('query', '')
+    if not query.strip():
+        return JsonResponse({'error': 'Query parameter is required'}, status=400)
+
+    try:
+        backend, page, page_size = parse_search_page(request.GET, query)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    # Misspelled words would make requireAllWords match nothing, so search for the correction
+    cursor_query = query
+    corrected = await sync_to_async(correct_query)(query)
+    query = corrected or query
+
+    local_page = await sync_to_async(search_local_page)(query, backend, page, page_size, cursor_query)
+    if local_page is not None:
+        foods, cursor = local_page
+    else:
+        if not settings.USDA_API_KEY:
+            return JsonResponse(
+                {'error': 'USDA API key not configured. Please set the USDA_API_KEY environment variable.'},
+                status=500
+            )
+        key = search_cache_key(query, SEARCH_DATA_TYPES, page, page_size)
+        try:
+            foods = await search_cache.aget_or_set(
+                key,
+                lambda: asearch_usda_foods(query, SEARCH_DATA_TYPES, page, page_size)
+            )
+        except (httpx.HTTPError, SharedCallFailed) as e:
+            return JsonResponse({'error': f'Error searching foods: {str(e)}'}, status=500)
+        cursor = next_search_cursor(cursor_query, 'usda', page, page_size, foods)
+        if cursor:
+            await sync_to_async(prefetch_search_page)(query, SEARCH_DATA_TYPES, page + 1, page_size)
+
+    response = JsonResponse(foods, safe=False)
+    if corrected:
+        response['X-Did-You-Mean'] = corrected
+    if cursor:
+        response['X-Next-Cursor'] = cursor
+    return response
+
+
+@async_token_required(['GET'])
+async def get_food_details_async(request, fdc_id):
+    """API endpoint to get food details from USDA API without blocking a worker thread"""
+    food_details = await aget_food_details(fdc_id)
+    if not food_details:
+        return JsonResponse({'error': 'Could not fetch food details'}, status=500)
+    return JsonResponse(food_details)
+
+
+@async_token_required(['POST'])
+async def create_food_entry_async(request):
+    """Create a new food entry, awaiting the USDA lookup instead of blocking on it"""
+    try:
+        entry_data = parse_food_entry_data(json.loads(request.body or b'{}'))
+    except (ValueError, TypeError, AttributeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    food_details = await aget_food_details(entry_data['fdc_id'])
+    if not food_details:
+        return JsonResponse({'error': 'Could not fetch food details'}, status=500)
+
+    try:
+        food_entry = await sync_to_async(save_food_entry)(request.user, entry_data, food_details)
+    except Exception as e:
+        logging.error(f"Error creating food entry: {e}")
+        return JsonResponse(
+            {'error': 'An error occurred while creating the food entry'},
+            status=500
+        )
+    return JsonResponse(created_food_entry_data(food_entry), status=201)
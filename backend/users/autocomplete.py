@@ -0,0 +1,357 @@
+import heapq
+import itertools
+import logging
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Prefixes up to this length match too many keys to scan per request, so their top
+# completions are precomputed at build time and maintained as the index changes
+SHORT_PREFIX_LENGTH = 3
+# Completions kept per short prefix; larger than the endpoint's limit so that
+# removals between rebuilds do not leave lists short
+TOP_K = 100
+# Upper bound on keys examined for a longer prefix before ranking
+MAX_SCAN = 2000
+# Only the first few word starts of a name are indexed, each truncated to KEY_LENGTH
+MAX_INDEXED_WORDS = 4
+KEY_LENGTH = 24
+# Past this many changed catalog rows the background sync rebuilds instead of patching
+MAX_INCREMENTAL_CHANGES = 50
+# Keys are stored in sorted blocks of about this many, so an insert or removal shifts one
+# block rather than the whole array
+BLOCK_SIZE = 1000
+
+
+def normalize(text):
+    """Case-fold text and collapse it to space-separated words"""
+    return ' '.join(re.findall(r'\w+', text.casefold()))
+
+
+def name_keys(name):
+    """Keys for every word start, so 'chicken breast' also matches 'breast'"""
+    words = normalize(name).split(' ')
+    return {
+        ' '.join(words[i:])[:KEY_LENGTH]
+        for i in range(min(len(words), MAX_INDEXED_WORDS))
+        if words[i]
+    }
+
+
+class PrefixIndex:
+    """In-process sorted-array prefix index over FoodItem names, ranked by popularity"""
+
+    def __init__(self):
+        # Sorted keys in blocks of about BLOCK_SIZE: _key_blocks[b][i] is a word-start key of
+        # the food _id_blocks[b][i], and _block_firsts[b] is the first key of block b
+        self._key_blocks = []
+        self._id_blocks = []
+        self._block_firsts = []
+        self._key_count = 0
+        self._names = {}  # fdc_id -> name
+        self._weights = {}  # fdc_id -> popularity; foods never logged are absent
+        self._short_tops = {}  # short prefix -> fdc_ids, best first
+        self._lock = threading.RLock()
+        self.memory_bytes = 0
+        self.built_at = None
+        self.synced_at = None
+
+    def build(self, rows, weights):
+        """Replace the index contents with rows of (fdc_id, name)"""
+        names = {}
+        pairs = []
+        interned = {}
+        for fdc_id, name in rows:
+            names[fdc_id] = name
+            for key in name_keys(name):
+                # Many foods share trailing words ("raw", "cooked"), so share the strings
+                pairs.append((interned.setdefault(key, key), fdc_id))
+        pairs.sort()
+        keys = [key for key, _ in pairs]
+        ids = [fdc_id for _, fdc_id in pairs]
+        del pairs, interned
+        weights = {fdc_id: weight for fdc_id, weight in weights.items() if fdc_id in names}
+
+        short_tops = self._build_short_tops(keys, ids, names, weights)
+        key_blocks = [keys[i:i + BLOCK_SIZE] for i in range(0, len(keys), BLOCK_SIZE)]
+        id_blocks = [ids[i:i + BLOCK_SIZE] for i in range(0, len(ids), BLOCK_SIZE)]
+        block_firsts = [block[0] for block in key_blocks]
+        key_count = len(keys)
+        del keys, ids
+        # Measured before the structures are shared, so stats() never walks them under the lock
+        memory_bytes = self._memory_usage(key_blocks, id_blocks, block_firsts, names, weights, short_tops)
+        with self._lock:
+            self._key_blocks = key_blocks
+            self._id_blocks = id_blocks
+            self._block_firsts = block_firsts
+            self._key_count = key_count
+            self._names = names
+            self._weights = weights
+            self._short_tops = short_tops
+            self.memory_bytes = memory_bytes
+            self.built_at = time.time()
+
+    def upsert(self, fdc_id, name):
+        """Add or rename a single food without rebuilding"""
+        with self._lock:
+            current = self._names.get(fdc_id)
+            if current == name:
+                return
+            if current is not None:
+                self._remove_food(fdc_id, current)
+            self._names[fdc_id] = name
+            for key in name_keys(name):
+                self._insert_key(key, fdc_id)
+            self._promote(fdc_id)
+
+    def upsert_many(self, rows):
+        """Upsert rows of (fdc_id, name), taking the lock once per row so completions interleave"""
+        for fdc_id, name in rows:
+            self.upsert(fdc_id, name)
+
+    def remove(self, fdc_id):
+        with self._lock:
+            name = self._names.pop(fdc_id, None)
+            if name is not None:
+                self._remove_food(fdc_id, name)
+                self._weights.pop(fdc_id, None)
+
+    def bump(self, fdc_id, amount=1):
+        """Increase a food's popularity weight, e.g. when it is logged"""
+        with self._lock:
+            if fdc_id in self._names:
+                self._weights[fdc_id] = self._weights.get(fdc_id, 0) + amount
+                self._promote(fdc_id)
+
+    def complete(self, prefix, limit=10):
+        """Return the most popular (fdc_id, name) pairs whose words start with prefix"""
+        prefix = normalize(prefix)[:KEY_LENGTH]
+        if not prefix:
+            return []
+        with self._lock:
+            if len(prefix) <= SHORT_PREFIX_LENGTH:
+                fdc_ids = self._short_tops.get(prefix, [])[:limit]
+            else:
+                candidates = set()
+                for key, fdc_id in itertools.islice(self._keys_from(prefix), MAX_SCAN):
+                    if not key.startswith(prefix):
+                        break
+                    candidates.add(fdc_id)
+                fdc_ids = self._rank(candidates, self._names, self._weights, limit)
+            return [(fdc_id, self._names[fdc_id]) for fdc_id in fdc_ids]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'foods': len(self._names),
+                'keys': self._key_count,
+                'short_prefixes': len(self._short_tops),
+                'memory_bytes': self.memory_bytes,  # As of the last build
+                'built_at': self.built_at,
+                'synced_at': self.synced_at.isoformat() if self.synced_at else None,
+            }
+
+    @staticmethod
+    def _memory_usage(key_blocks, id_blocks, block_firsts, names, weights, short_tops):
+        """Approximate bytes held by the given index structures"""
+        seen = set()
+        size = 0
+        for obj in itertools.chain(
+            (key_blocks, id_blocks, block_firsts, names, weights, short_tops),
+            key_blocks,
+            id_blocks,
+            itertools.chain.from_iterable(key_blocks),
+            itertools.chain.from_iterable(id_blocks),
+            itertools.chain.from_iterable(names.items()),
+            weights.values(),
+            itertools.chain.from_iterable(short_tops.items()),
+        ):
+            if id(obj) not in seen:
+                seen.add(id(obj))
+                size += sys.getsizeof(obj)
+        return size
+
+    @staticmethod
+    def _rank(fdc_ids, names, weights, limit):
+        # Most popular first, then shorter (more generic) names
+        return heapq.nsmallest(
+            limit,
+            fdc_ids,
+            key=lambda fdc_id: (-weights.get(fdc_id, 0), len(names[fdc_id]), fdc_id)
+        )
+
+    @classmethod
+    def _build_short_tops(cls, keys, ids, names, weights):
+        """Rank the longest short prefixes from their ranges, then merge upwards"""
+        tops = {}
+        groups = {}
+        for key, fdc_id in zip(keys, ids):
+            groups.setdefault(key[:SHORT_PREFIX_LENGTH], set()).add(fdc_id)
+        for prefix, fdc_ids in groups.items():
+            tops[prefix] = cls._rank(fdc_ids, names, weights, TOP_K)
+
+        # Every match for a prefix is in the top list of one of its one-character extensions
+        for length in range(SHORT_PREFIX_LENGTH - 1, 0, -1):
+            merged = {}
+            for prefix, top in list(tops.items()):
+                if len(prefix) > length:
+                    merged.setdefault(prefix[:length], set()).update(top)
+            for prefix, fdc_ids in merged.items():
+                fdc_ids.update(tops.get(prefix, ()))
+                tops[prefix] = cls._rank(fdc_ids, names, weights, TOP_K)
+        return tops
+
+    @staticmethod
+    def _short_prefixes(name):
+        return {
+            key[:length]
+            for key in name_keys(name)
+            for length in range(1, min(len(key), SHORT_PREFIX_LENGTH) + 1)
+        }
+
+    def _keys_from(self, key):
+        """(key, fdc_id) pairs in order, starting at the first key >= key"""
+        # Block b may end with copies of key that the next block starts with
+        block = max(bisect_left(self._block_firsts, key) - 1, 0)
+        if block >= len(self._key_blocks):
+            return
+        pos = bisect_left(self._key_blocks[block], key)
+        for b in range(block, len(self._key_blocks)):
+            keys, ids = self._key_blocks[b], self._id_blocks[b]
+            for i in range(pos, len(keys)):
+                yield keys[i], ids[i]
+            pos = 0
+
+    def _insert_key(self, key, fdc_id):
+        if not self._key_blocks:
+            self._key_blocks.append([key])
+            self._id_blocks.append([fdc_id])
+            self._block_firsts.append(key)
+            self._key_count += 1
+            return
+        block = max(bisect_right(self._block_firsts, key) - 1, 0)
+        keys, ids = self._key_blocks[block], self._id_blocks[block]
+        pos = bisect_right(keys, key)
+        keys.insert(pos, key)
+        ids.insert(pos, fdc_id)
+        self._block_firsts[block] = keys[0]
+        if len(keys) > 2 * BLOCK_SIZE:
+            self._key_blocks.insert(block + 1, keys[BLOCK_SIZE:])
+            self._id_blocks.insert(block + 1, ids[BLOCK_SIZE:])
+            self._block_firsts.insert(block + 1, keys[BLOCK_SIZE])
+            del keys[BLOCK_SIZE:], ids[BLOCK_SIZE:]
+        self._key_count += 1
+
+    def _remove_key(self, key, fdc_id):
+        block = max(bisect_left(self._block_firsts, key) - 1, 0)
+        pos = bisect_left(self._key_blocks[block], key) if block < len(self._key_blocks) else 0
+        while block < len(self._key_blocks):
+            keys, ids = self._key_blocks[block], self._id_blocks[block]
+            while pos < len(keys) and keys[pos] == key:
+                if ids[pos] == fdc_id:
+                    del keys[pos], ids[pos]
+                    if keys:
+                        self._block_firsts[block] = keys[0]
+                    else:
+                        del self._key_blocks[block], self._id_blocks[block], self._block_firsts[block]
+                    self._key_count -= 1
+                    return
+                pos += 1
+            if pos < len(keys):
+                return
+            block, pos = block + 1, 0
+
+    def _remove_food(self, fdc_id, name):
+        """Drop the keys of a food's name, and the food from that name's short-prefix lists"""
+        for key in name_keys(name):
+            self._remove_key(key, fdc_id)
+        for prefix in self._short_prefixes(name):
+            top = self._short_tops.get(prefix)
+            if top and fdc_id in top:
+                top.remove(fdc_id)
+
+    def _promote(self, fdc_id):
+        """Re-rank fdc_id within the precomputed short-prefix lists it belongs to"""
+        for prefix in self._short_prefixes(self._names[fdc_id]):
+            top = [other for other in self._short_tops.get(prefix, []) if other != fdc_id]
+            top.append(fdc_id)
+            self._short_tops[prefix] = self._rank(top, self._names, self._weights, TOP_K)
+
+
+food_index = PrefixIndex()
+_sync_lock = threading.Lock()
+
+
+def load_food_index(index):
+    """Build index from the FoodItem catalog and logged-entry popularity"""
+    from .models import FoodEntry, FoodItem
+
+    synced_at = timezone.now()
+    weights = dict(
+        FoodEntry.objects.exclude(fdc_id__isnull=True)
+        .values('fdc_id')
+        .annotate(count=Count('id'))
+        .values_list('fdc_id', 'count')
+    )
+    rows = (
+        FoodItem.objects.filter(fdc_id__isnull=False)
+        .values_list('fdc_id', 'name')
+        .iterator(chunk_size=5000)
+    )
+    index.build(rows, weights)
+    index.synced_at = synced_at
+    logger.info(f"Built autocomplete index: {index.stats()}")
+
+
+def _sync_in_background(rebuild):
+    try:
+        if rebuild or not _apply_catalog_changes():
+            load_food_index(food_index)
+    except Exception as e:
+        logger.error(f"Autocomplete index sync failed: {e}")
+    finally:
+        connections.close_all()
+        _sync_lock.release()
+
+
+def _apply_catalog_changes():
+    """Upsert rows changed since the last sync; False if there are too many for that"""
+    from .models import FoodItem
+
+    synced_at = timezone.now()
+    # Only rows touched since the last sync, e.g. by an import_fdc run
+    changed = list(
+        FoodItem.objects.filter(fdc_id__isnull=False, updated_at__gte=food_index.synced_at)
+        .values_list('fdc_id', 'name')[:MAX_INCREMENTAL_CHANGES + 1]
+    )
+    if len(changed) > MAX_INCREMENTAL_CHANGES:
+        return False
+    food_index.upsert_many(changed)
+    food_index.synced_at = synced_at
+    return True
+
+
+def get_food_index():
+    """Return the process-wide index, starting a build or catalog sync if one is due.
+
+    Builds and syncs run on a background thread, never in the request; until a worker's first
+    build finishes its index is empty and completes nothing.
+    """
+    if food_index.built_at is None:
+        rebuild_due, sync_due = True, False
+    else:
+        rebuild_due = time.time() - food_index.built_at > settings.AUTOCOMPLETE_REBUILD_INTERVAL
+        sync_due = (timezone.now() - food_index.synced_at).total_seconds() > settings.AUTOCOMPLETE_SYNC_INTERVAL
+    if (rebuild_due or sync_due) and _sync_lock.acquire(blocking=False):
+        # The current index keeps serving until the new one is swapped in
+        threading.Thread(target=_sync_in_background, args=(rebuild_due,), daemon=True).start()
+    return food_index
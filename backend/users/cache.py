@@ -0,0 +1,433 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import caches
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# Returned by LRUCache.get so that cached falsy values (e.g. empty result lists) still count as hits
+MISSING = object()
+
+
+class LRUCache:
+    """Bounded, thread-safe in-process LRU cache with per-entry expiry"""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return MISSING
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedCallFailed(Exception):
+    """The call another process was making for a key failed, so waiting for it is pointless"""
+
+
+class _Call:
+    """A computation in flight, shared by every caller that asked for the same key"""
+
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key so that only one of them does the work.
+
+    Within a process, callers that arrive while a key is in flight wait for the first
+    caller's result: threads through do(), coroutines on the same event loop through ado().
+    With a cache_alias, the first caller also takes a lock in that cache, and callers in
+    other processes poll lookup() until the result shows up there. If that call fails, it
+    says so in the cache and its remote waiters raise SharedCallFailed instead of each
+    retrying the work themselves.
+    """
+
+    def __init__(self, name, cache_alias=None, lock_timeout=10, poll_interval=0.05, max_poll_interval=1):
+        self.name = name
+        self.cache_alias = cache_alias
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self._calls = {}
+        self._async_calls = {}  # event loop -> {key: task}
+        self._lock = threading.Lock()
+        self._counters = {
+            'calls': 0,
+            'executed': 0,
+            'coalesced': 0,
+            'remote_coalesced': 0,
+            'remote_failed': 0,
+            'rechecked': 0,
+            'errors': 0,
+        }
+
+    def do(self, key, fn, lookup=None):
+        """Return fn() for key, sharing a single execution between concurrent callers.
+
+        lookup, if given, returns the stored result of an earlier fn() or MISSING. It is
+        checked again once this caller is the only one left computing the key.
+        """
+        with self._lock:
+            self._counters['calls'] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._counters['coalesced'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = self._run(key, fn, lookup)
+            return call.value
+        except Exception as e:
+            call.error = e
+            self._count('errors')
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key, fn, lookup=None):
+        """Async do(): fn and lookup are coroutine functions.
+
+        The work runs in a task of its own that every caller awaits through a shield, so a
+        caller being cancelled (e.g. its client disconnected) never cancels it for the others.
+        Calls are coalesced per event loop, since a task can only be awaited on its own loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._counters['calls'] += 1
+            calls = self._async_calls.setdefault(loop, {})
+            task = calls.get(key)
+            if task is None:
+                task = calls[key] = loop.create_task(self._arun_shared(key, fn, lookup))
+                task.add_done_callback(lambda done: self._forget_async_call(loop, key, done))
+            else:
+                self._counters['coalesced'] += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['in_flight'] = len(self._calls) + sum(len(calls) for calls in self._async_calls.values())
+        stats['saved'] = stats['coalesced'] + stats['remote_coalesced'] + stats['rechecked']
+        return stats
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    async def _arun_shared(self, key, fn, lookup):
+        try:
+            return await self._arun(key, fn, lookup)
+        except Exception:
+            self._count('errors')
+            raise
+
+    def _forget_async_call(self, loop, key, task):
+        with self._lock:
+            calls = self._async_calls.get(loop, {})
+            if calls.get(key) is task:
+                del calls[key]
+                if not calls:
+                    del self._async_calls[loop]
+        # Every caller may have given up, so mark the outcome as seen
+        if not task.cancelled():
+            task.exception()
+
+    def _shared_keys(self, key):
+        prefix = f"singleflight:{self.name}:{key}"
+        return f"{prefix}:lock", f"{prefix}:failed"
+
+    def _run(self, key, fn, lookup):
+        # A caller that just finished may have stored the result after this one missed it
+        if lookup is not None:
+            value = lookup()
+            if value is not MISSING:
+                self._count('rechecked')
+                return value
+
+        if self.cache_alias is None or lookup is None:
+            self._count('executed')
+            return fn()
+
+        # Other processes may be computing the same key; wait for them rather than repeat the work
+        shared = caches[self.cache_alias]
+        lock_key, failed_key = self._shared_keys(key)
+        token = uuid.uuid4().hex
+        acquired = shared.add(lock_key, token, self.lock_timeout)
+        if not acquired:
+            value = self._wait_for(lookup, lock_key, failed_key)
+            if value is not MISSING:
+                self._count('remote_coalesced')
+                return value
+
+        stored = False
+        try:
+            self._count('executed')
+            value = fn()
+            # The waiters can only be served through lookup, so a call that stored nothing failed
+            stored = acquired and lookup() is not MISSING
+            return value
+        finally:
+            if acquired:
+                if not stored:
+                    shared.set(failed_key, token, self.lock_timeout)
+                shared.delete(lock_key)
+
+    async def _arun(self, key, fn, lookup):
+        if lookup is not None:
+            value = await lookup()
+            if value is not MISSING:
+                self._count('rechecked')
+                return value
+
+        if self.cache_alias is None or lookup is None:
+            self._count('executed')
+            return await fn()
+
+        shared = caches[self.cache_alias]
+        lock_key, failed_key = self._shared_keys(key)
+        token = uuid.uuid4().hex
+        acquired = await shared.aadd(lock_key, token, self.lock_timeout)
+        if not acquired:
+            value = await self._await_for(lookup, lock_key, failed_key)
+            if value is not MISSING:
+                self._count('remote_coalesced')
+                return value
+
+        stored = False
+        try:
+            self._count('executed')
+            value = await fn()
+            stored = acquired and await lookup() is not MISSING
+            return value
+        finally:
+            if acquired:
+                if not stored:
+                    await shared.aset(failed_key, token, self.lock_timeout)
+                await shared.adelete(lock_key)
+
+    def _poll_intervals(self):
+        """Growing sleeps between checks on another process's call, until lock_timeout"""
+        deadline = time.monotonic() + self.lock_timeout
+        interval = self.poll_interval
+        while time.monotonic() < deadline:
+            yield min(interval, max(deadline - time.monotonic(), 0))
+            interval = min(interval * 2, self.max_poll_interval)
+
+    def _wait_for(self, lookup, lock_key, failed_key):
+        shared = caches[self.cache_alias]
+        leader = shared.get(lock_key)
+        for interval in self._poll_intervals():
+            time.sleep(interval)
+            value = lookup()
+            if value is not MISSING:
+                return value
+            state = shared.get_many([lock_key, failed_key])
+            if leader is not None and state.get(failed_key) == leader:
+                self._count('remote_failed')
+                raise SharedCallFailed(f"{self.name} call for this key failed in another process")
+            if lock_key not in state:
+                # The call ended without a stored result or a failure; do the work here
+                break
+        return lookup()
+
+    async def _await_for(self, lookup, lock_key, failed_key):
+        shared = caches[self.cache_alias]
+        leader = await shared.aget(lock_key)
+        for interval in self._poll_intervals():
+            await asyncio.sleep(interval)
+            value = await lookup()
+            if value is not MISSING:
+                return value
+            state = await shared.aget_many([lock_key, failed_key])
+            if leader is not None and state.get(failed_key) == leader:
+                self._count('remote_failed')
+                raise SharedCallFailed(f"{self.name} call for this key failed in another process")
+            if lock_key not in state:
+                break
+        return await lookup()
+
+
+class BackgroundRefresher:
+    """Run cache refreshes on a small thread pool so request latency never includes them.
+
+    A key is refreshed at most once per min_interval seconds, so an upstream outage does
+    not turn every request for a stale entry into another refresh that will fail too.
+    """
+
+    MAX_TRACKED_KEYS = 10000
+
+    def __init__(self, name, max_workers=2, min_interval=60):
+        self.name = name
+        self.max_workers = max_workers
+        self.min_interval = min_interval
+        self._executor = None
+        self._executor_pid = None
+        self._attempts = {}  # key -> monotonic time of its last refresh
+        self._lock = threading.Lock()
+        self._counters = {'submitted': 0, 'throttled': 0, 'failed': 0}
+
+    def submit(self, key, fn):
+        """Queue fn() unless key was refreshed recently; return whether it was queued"""
+        now = time.monotonic()
+        with self._lock:
+            last = self._attempts.get(key)
+            if last is not None and now - last < self.min_interval:
+                self._counters['throttled'] += 1
+                return False
+            if len(self._attempts) >= self.MAX_TRACKED_KEYS:
+                self._attempts = {
+                    other: at for other, at in self._attempts.items() if now - at < self.min_interval
+                }
+            self._attempts[key] = now
+            self._counters['submitted'] += 1
+            # Worker threads do not survive a fork, so each process needs its own pool
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix=f"refresh-{self.name}",
+                )
+                self._executor_pid = os.getpid()
+            executor = self._executor
+        executor.submit(self._run, key, fn)
+        return True
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['queued'] = self._executor._work_queue.qsize() if self._executor else 0
+        return stats
+
+    def _run(self, key, fn):
+        close_old_connections()
+        try:
+            fn()
+        except Exception as e:
+            logger.error(f"Background refresh of {self.name} {key} failed: {e}")
+            with self._lock:
+                self._counters['failed'] += 1
+        finally:
+            close_old_connections()
+
+
+class TieredCache:
+    """In-process LRU in front of a shared Django cache, with stampede protection"""
+
+    def __init__(self, prefix, maxsize=1024, ttl=300, cache_alias='default', lock_timeout=10):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.cache_alias = cache_alias
+        self.local = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.flight = SingleFlight(prefix, cache_alias=cache_alias, lock_timeout=lock_timeout)
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias]
+
+    def make_key(self, raw_key):
+        """Hash a raw key so it is safe for every cache backend"""
+        digest = hashlib.sha1(raw_key.encode('utf-8')).hexdigest()
+        return f"{self.prefix}:{digest}"
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not MISSING:
+            return value
+        value = self.shared.get(key, MISSING)
+        if value is not MISSING:
+            self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.shared.set(key, value, self.ttl)
+        self.local.set(key, value)
+
+    async def aget(self, key):
+        value = self.local.get(key)
+        if value is not MISSING:
+            return value
+        value = await self.shared.aget(key, MISSING)
+        if value is not MISSING:
+            self.local.set(key, value)
+        return value
+
+    async def aset(self, key, value):
+        await self.shared.aset(key, value, self.ttl)
+        self.local.set(key, value)
+
+    def get_or_set(self, key, compute):
+        """Return the cached value for key, computing it at most once across concurrent callers"""
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+
+        def compute_and_store():
+            value = compute()
+            self.set(key, value)
+            return value
+
+        return self.flight.do(key, compute_and_store, lookup=lambda: self.get(key))
+
+    async def aget_or_set(self, key, compute):
+        """Async get_or_set: compute is a coroutine function"""
+        value = await self.aget(key)
+        if value is not MISSING:
+            return value
+
+        async def compute_and_store():
+            value = await compute()
+            await self.aset(key, value)
+            return value
+
+        return await self.flight.ado(key, compute_and_store, lookup=lambda: self.aget(key))
@@ -0,0 +1,104 @@
+import copy
+
+from django.db import connection, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .models import DailyNutritionSummary, FoodDiaryVersion, FoodEntry, FoodEntryTombstone
+from .signals import bump_logged_foods
+
+# Every write to a user's food entries goes through these functions, which keep the derived
+# state in step in the same transaction: DailyNutritionSummary rows, the FoodDiaryVersion
+# counter and FoodEntry.sync_seq, and tombstones for deleted entries.
+#
+# Locks are taken in one order everywhere (entry rows, then the version row, then the user
+# row in DailyNutritionSummary.record_changes) so concurrent writers cannot deadlock.
+
+# Columns DELETE ... RETURNING hands back for the summary deltas
+DELETED_ENTRY_COLUMNS = (
+    'id', 'user_id', 'entry_date', 'meal_type', 'number_of_servings', 'serving_size',
+    'serving_size_unit', *FoodEntry.NUTRIENT_FIELDS,
+)
+
+
+def create_food_entries(user, food_entries):
+    """Insert unsaved FoodEntry objects for user with one bulk_create"""
+    with transaction.atomic():
+        sync_seq = FoodDiaryVersion.bump(user.id)
+        for food_entry in food_entries:
+            food_entry.user = user
+            food_entry.sync_seq = sync_seq
+        food_entries = FoodEntry.objects.bulk_create(food_entries)
+        DailyNutritionSummary.record_changes(added=food_entries)
+    bump_logged_foods(food_entries)
+    return food_entries
+
+
+def save_food_entry_edit(food_entry, previous):
+    """Save edits to a food entry locked with select_for_update; previous is its state before them"""
+    with transaction.atomic():
+        food_entry.sync_seq = FoodDiaryVersion.bump(food_entry.user_id)
+        food_entry.save()
+        DailyNutritionSummary.record_changes(added=[food_entry], removed=[previous])
+
+
+def update_food_entries(user, changes_by_id):
+    """Apply {entry id: {field: value}} to user's entries with one UPDATE.
+
+    Returns the updated entries as they are after the update; ids that are not the user's
+    entries are skipped.
+    """
+    with transaction.atomic():
+        previous = list(FoodEntry.objects.select_for_update().filter(user=user, id__in=list(changes_by_id)))
+        if not previous:
+            return []
+        sync_seq = FoodDiaryVersion.bump(user.id)
+
+        updated = []
+        whens = {}
+        for food_entry in previous:
+            updated_entry = copy.copy(food_entry)
+            updated_entry.sync_seq = sync_seq
+            for field, value in changes_by_id[food_entry.id].items():
+                setattr(updated_entry, field, value)
+                whens.setdefault(field, []).append(When(id=food_entry.id, then=Value(value)))
+            updated.append(updated_entry)
+
+        # update() skips auto_now, so updated_at is set here; entries not changing a field keep
+        # their current value
+        now = timezone.now()
+        FoodEntry.objects.filter(id__in=[food_entry.id for food_entry in previous]).update(
+            updated_at=now,
+            sync_seq=sync_seq,
+            **{
+                field: Case(*field_whens, default=F(field), output_field=FoodEntry._meta.get_field(field))
+                for field, field_whens in whens.items()
+            }
+        )
+        for updated_entry in updated:
+            updated_entry.updated_at = now
+        DailyNutritionSummary.record_changes(added=updated, removed=previous)
+    return updated
+
+
+def delete_food_entries(user, ids):
+    """Delete user's entries with one DELETE ... RETURNING, leaving tombstones; returns the deleted ids"""
+    with transaction.atomic():
+        # RETURNING hands back what the summaries need, so rows are not selected first
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FoodEntry._meta.db_table} WHERE user_id = %s AND id = ANY(%s) '
+                f'RETURNING {", ".join(DELETED_ENTRY_COLUMNS)}',
+                [user.id, list(set(ids))]
+            )
+            deleted = [FoodEntry(**dict(zip(DELETED_ENTRY_COLUMNS, row))) for row in cursor.fetchall()]
+        if not deleted:
+            return set()
+
+        sync_seq = FoodDiaryVersion.bump(user.id)
+        FoodEntryTombstone.objects.bulk_create(
+            FoodEntryTombstone(user=user, entry_id=food_entry.id, sync_seq=sync_seq)
+            for food_entry in deleted
+        )
+        DailyNutritionSummary.record_changes(removed=deleted)
+    return {food_entry.id for food_entry in deleted}
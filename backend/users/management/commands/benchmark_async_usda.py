@@ -0,0 +1,209 @@
+import asyncio
+import json
+import multiprocessing
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import AsyncClient, Client, override_settings
+from rest_framework.authtoken.models import Token
+
+from users.usda import get_async_usda_client, reset_usda_clients
+
+SEARCH_RESPONSE = json.dumps({
+    'foods': [
+        {'fdcId': 100000 + i, 'description': f'Benchmark food {i}', 'dataType': 'Foundation'}
+        for i in range(10)
+    ]
+}).encode('utf-8')
+
+
+class StandInServer:
+    """Minimal keep-alive USDA stand-in that answers every request after a fixed delay.
+
+    It runs in its own process so it does not compete with the benchmarked views for the GIL.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.port = None
+        self._process = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/fdc/v1"
+
+    def start(self):
+        context = multiprocessing.get_context('fork')
+        ports = context.SimpleQueue()
+        self._process = context.Process(target=self._run, args=(ports,), daemon=True)
+        self._process.start()
+        self.port = ports.get()
+
+    def stop(self):
+        self._process.terminate()
+        self._process.join()
+
+    def _run(self, ports):
+        async def serve():
+            server = await asyncio.start_server(self._handle, '127.0.0.1', 0, backlog=4096)
+            ports.put(server.sockets[0].getsockname()[1])
+            await server.serve_forever()
+
+        asyncio.run(serve())
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                content_length = 0
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    if name.strip().lower() == 'content-length':
+                        content_length = int(value.strip())
+                if content_length:
+                    await reader.readexactly(content_length)
+                await asyncio.sleep(self.latency)
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                    + f'Content-Length: {len(SEARCH_RESPONSE)}\r\n\r\n'.encode('latin-1')
+                    + SEARCH_RESPONSE
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+@contextmanager
+def persistent_db_connections():
+    """Keep database connections open across requests, so runs measure the USDA fan-out
+    rather than a new database connection for every request"""
+    connections.close_all()
+    previous = connections.settings[DEFAULT_DB_ALIAS]['CONN_MAX_AGE']
+    connections.settings[DEFAULT_DB_ALIAS]['CONN_MAX_AGE'] = None
+    try:
+        yield
+    finally:
+        connections.settings[DEFAULT_DB_ALIAS]['CONN_MAX_AGE'] = previous
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare /auth/foods/search/ throughput on the sync (WSGI) view and the async (ASGI) '
+        'view against a local USDA stand-in with a fixed upstream latency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            nargs='+',
+            default=[100, 500, 1000],
+            help='Concurrent searches per run'
+        )
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0.2,
+            help='Seconds the stand-in waits before answering each request'
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=16,
+            help='Threads serving the sync view, like a gthread WSGI worker'
+        )
+
+    def handle(self, *args, **options):
+        server = StandInServer(options['latency'])
+        server.start()
+
+        user = get_user_model().objects.create_user(
+            email=f"benchmark-{uuid.uuid4().hex[:12]}@smartbite.local",
+            password=uuid.uuid4().hex
+        )
+        token = Token.objects.create(user=user)
+        try:
+            with override_settings(
+                USDA_API_BASE_URL=server.url,
+                USDA_API_KEY='benchmark',
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            ), persistent_db_connections():
+                reset_usda_clients()
+                self.stdout.write(
+                    f"Upstream latency {options['latency'] * 1000:.0f} ms, "
+                    f"{options['threads']} WSGI threads\n"
+                )
+                self.stdout.write(f"{'concurrency':>11}  {'mode':<5}  {'req/s':>8}  {'p50 ms':>8}  {'p99 ms':>8}")
+                for concurrency in options['concurrency']:
+                    for mode, run in (('wsgi', self.run_sync), ('asgi', self.run_async)):
+                        # Unique queries so every request misses the search cache and goes upstream
+                        run_id = uuid.uuid4().hex[:8]
+                        queries = [f"benchmark {run_id} {i}" for i in range(concurrency)]
+                        elapsed, latencies = run(token.key, queries, options['threads'])
+                        self.report(concurrency, mode, elapsed, latencies)
+        finally:
+            reset_usda_clients()
+            user.delete()
+            server.stop()
+
+    def report(self, concurrency, mode, elapsed, latencies):
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(
+            f"{concurrency:>11}  {mode:<5}  {len(latencies) / elapsed:>8.1f}  "
+            f"{statistics.median(latencies) * 1000:>8.1f}  {p99 * 1000:>8.1f}"
+        )
+
+    def run_sync(self, token, queries, threads):
+        local = threading.local()
+
+        def search(query):
+            if not hasattr(local, 'client'):
+                local.client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+            response = local.client.get('/auth/foods/search/', {'query': query})
+            assert response.status_code == 200, response.content
+            # Latency as the caller sees it, including time queued for a free thread
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            latencies = list(executor.map(search, queries))
+        elapsed = time.perf_counter() - started
+        connections.close_all()
+        return elapsed, latencies
+
+    def run_async(self, token, queries, threads):
+        async def search(client, query, started):
+            response = await client.get(
+                '/auth/foods/search/async/',
+                {'query': query},
+                headers={'authorization': f'Token {token}'}
+            )
+            assert response.status_code == 200, response.content
+            return time.perf_counter() - started
+
+        async def run():
+            client = AsyncClient()
+            started = time.perf_counter()
+            latencies = await asyncio.gather(*(search(client, query, started) for query in queries))
+            elapsed = time.perf_counter() - started
+            await get_async_usda_client().aclose()
+            return elapsed, list(latencies)
+
+        return asyncio.run(run())
@@ -0,0 +1,96 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import FoodItem
+from users.usda import USDA_FOOD_PARAMS, get_usda_client
+from users.views import parse_food_details
+
+
+def parse_by_name(data):
+    """The name-matching parser get_food_details used before the USDA_NUTRIENTS table"""
+    nutrients = {
+        'calories': 0,
+        'protein': 0,
+        'fat': 0,
+        'carbs': 0
+    }
+    for nutrient in data.get('foodNutrients', []):
+        if nutrient.get('nutrient', {}).get('name') == 'Energy':
+            nutrients['calories'] = nutrient.get('amount', 0)
+        elif nutrient.get('nutrient', {}).get('name') == 'Protein':
+            nutrients['protein'] = nutrient.get('amount', 0)
+        elif nutrient.get('nutrient', {}).get('name') == 'Total lipid (fat)':
+            nutrients['fat'] = nutrient.get('amount', 0)
+        elif nutrient.get('nutrient', {}).get('name') == 'Carbohydrate, by difference':
+            nutrients['carbs'] = nutrient.get('amount', 0)
+    return {
+        'name': data.get('description', ''),
+        'nutrients': nutrients
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare bytes transferred and parse time per food lookup for full-format responses '
+        'parsed by nutrient name against abridged, nutrient-filtered responses parsed by ID'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'fdc_ids',
+            nargs='*',
+            help='Foods to look up; defaults to a sample of foods already in the catalog'
+        )
+        parser.add_argument(
+            '--sample',
+            type=int,
+            default=10,
+            help='Catalog foods to use when no fdc_ids are given'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=1000,
+            help='Times each response is parsed when timing'
+        )
+
+    def handle(self, *args, **options):
+        fdc_ids = options['fdc_ids'] or list(
+            FoodItem.objects.filter(fdc_id__isnull=False)
+            .order_by('fdc_id')
+            .values_list('fdc_id', flat=True)[:options['sample']]
+        )
+        if not fdc_ids:
+            raise CommandError('No fdc_ids given and the FoodItem catalog is empty')
+
+        client = get_usda_client()
+        full = [client.get(f"/food/{fdc_id}") for fdc_id in fdc_ids]
+        abridged = [client.get(f"/food/{fdc_id}", params=USDA_FOOD_PARAMS) for fdc_id in fdc_ids]
+
+        runs = (
+            ('full, by name', full, parse_by_name),
+            ('full, by id', full, parse_food_details),
+            ('abridged, by id', abridged, parse_food_details),
+        )
+        self.stdout.write(f"{len(fdc_ids)} foods, each response parsed {options['repeat']} times")
+        self.stdout.write(f"{'mode':<16}  {'body bytes':>10}  {'wire bytes':>10}  {'parse us':>9}")
+        for mode, responses, parse in runs:
+            bodies = [response.content for response in responses]
+            # Content-Length is the compressed size when the response was gzipped
+            wire = [int(response.headers.get('Content-Length', len(response.content))) for response in responses]
+            per_lookup = self.time_parse(bodies, parse, options['repeat'])
+            self.stdout.write(
+                f"{mode:<16}  {sum(map(len, bodies)) / len(bodies):>10.0f}  "
+                f"{sum(wire) / len(wire):>10.0f}  {per_lookup * 1e6:>9.1f}"
+            )
+
+    @staticmethod
+    def time_parse(bodies, parse, repeat):
+        """Seconds per lookup to decode a response body and extract its nutrients"""
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for body in bodies:
+                parse(json.loads(body))
+        return (time.perf_counter() - started) / (repeat * len(bodies))
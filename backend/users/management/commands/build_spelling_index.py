@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.spelling import build_spelling_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search spelling-correction index from the FoodItem catalog and save it to disk'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default=settings.SPELLING_INDEX_PATH,
+            help='Where to write the index (defaults to SPELLING_INDEX_PATH, which workers load)'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        index = build_spelling_index()
+        index.save(options['output'])
+        stats = index.stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {stats['words']} words ({stats['deletes']} deletes) into {options['output']} "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,253 @@
+import csv
+import io
+import json
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from users.models import FoodItem
+from users.usda import USDA_NUTRIENTS, extract_nutrients
+
+# FoodItem columns filled from the USDA_NUTRIENTS fields
+COLUMNS = ('calories_per_100g', 'protein_per_100g', 'fat_per_100g', 'carbs_per_100g')
+
+# data_type values used in the CSV downloads, mapped to the names the API returns
+CSV_DATA_TYPES = {
+    'foundation_food': 'Foundation',
+    'sr_legacy_food': 'SR Legacy',
+    'survey_fndds_food': 'Survey (FNDDS)',
+    'branded_food': 'Branded',
+}
+
+UPDATE_FIELDS = ['name', 'data_type', *COLUMNS, 'fetched_at', 'updated_at']
+
+
+class Command(BaseCommand):
+    help = 'Stream USDA FoodData Central downloads (CSV or JSON) into the FoodItem catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='+',
+            help='FDC download: a .zip, an extracted CSV directory, or a .json file'
+        )
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per bulk upsert')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Import several downloads in parallel, one process per download'
+        )
+        parser.add_argument(
+            '--data-types',
+            default='',
+            help='Comma-separated data types to import, e.g. "Foundation,SR Legacy" (default: all)'
+        )
+
+    def handle(self, *args, **options):
+        paths = options['paths']
+        for path in paths:
+            if not os.path.exists(path):
+                raise CommandError(f"{path} does not exist")
+
+        data_types = {t.strip() for t in options['data_types'].split(',') if t.strip()}
+        batch_size = options['batch_size']
+        workers = max(1, min(options['workers'], len(paths)))
+
+        total = 0
+        if workers == 1:
+            for path in paths:
+                count = import_download(path, batch_size, data_types)
+                self.stdout.write(f"{path}: {count} foods imported")
+                total += count
+        else:
+            # Child processes must open their own database connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+                futures = {
+                    executor.submit(import_download, path, batch_size, data_types): path
+                    for path in paths
+                }
+                for future in as_completed(futures):
+                    count = future.result()
+                    self.stdout.write(f"{futures[future]}: {count} foods imported")
+                    total += count
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {total} foods"))
+
+
+def import_download(path, batch_size, data_types):
+    """Parse one FDC download and upsert it into FoodItem in batches"""
+    try:
+        count = 0
+        for batch in batched(iter_download(path, data_types), batch_size):
+            upsert_foods(batch)
+            count += len(batch)
+        return count
+    finally:
+        connections.close_all()
+
+
+def upsert_foods(rows):
+    fetched_at = timezone.now()
+    FoodItem.objects.bulk_create(
+        [FoodItem(fetched_at=fetched_at, **row) for row in rows],
+        update_conflicts=True,
+        unique_fields=['fdc_id'],
+        update_fields=UPDATE_FIELDS,
+    )
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_download(path, data_types):
+    """Yield FoodItem field dicts from a download, detecting its format"""
+    if os.path.isdir(path):
+        yield from iter_csv_foods(
+            lambda name: open(os.path.join(path, name), encoding='utf-8', newline=''),
+            data_types
+        )
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            members = {os.path.basename(name): name for name in archive.namelist()}
+
+            def open_member(name):
+                if name not in members:
+                    raise CommandError(f"{path} does not contain {name}")
+                return io.TextIOWrapper(archive.open(members[name]), encoding='utf-8', newline='')
+
+            if 'food.csv' in members:
+                yield from iter_csv_foods(open_member, data_types)
+            else:
+                json_members = [name for name in members if name.endswith('.json')]
+                if not json_members:
+                    raise CommandError(f"{path} contains neither food.csv nor a JSON file")
+                with open_member(json_members[0]) as fileobj:
+                    yield from iter_json_foods(fileobj, data_types)
+    elif path.endswith('.json'):
+        with open(path, encoding='utf-8') as fileobj:
+            yield from iter_json_foods(fileobj, data_types)
+    else:
+        raise CommandError(f"Unrecognised FDC download: {path}")
+
+
+def iter_csv_foods(open_file, data_types):
+    """Join food.csv with food_nutrient.csv.
+
+    A first pass over food.csv picks out the foods to import, so nutrients are only held in
+    memory for those, and each is dropped as its food is yielded by the second pass.
+    """
+    wanted = set()
+    with open_file('food.csv') as fileobj:
+        for row in csv.DictReader(fileobj):
+            if csv_data_type(row, data_types) is not None:
+                wanted.add(row['fdc_id'])
+
+    nutrients = {}
+    with open_file('food_nutrient.csv') as fileobj:
+        for row in csv.DictReader(fileobj):
+            if row['fdc_id'] not in wanted:
+                continue
+            try:
+                nutrient_id = int(row['nutrient_id'])
+            except (TypeError, ValueError):
+                continue
+            if nutrient_id in USDA_NUTRIENTS:
+                record_nutrient(nutrients, row['fdc_id'], nutrient_id, row.get('amount'))
+    del wanted
+
+    with open_file('food.csv') as fileobj:
+        for row in csv.DictReader(fileobj):
+            data_type = csv_data_type(row, data_types)
+            if data_type is None:
+                continue
+            values = {field: amount for field, (_, amount) in nutrients.pop(row['fdc_id'], {}).items()}
+            yield food_row(row['fdc_id'], row.get('description', ''), data_type, values)
+
+
+def csv_data_type(row, data_types):
+    """The API name of a food.csv row's data type, or None if it is not being imported"""
+    data_type = CSV_DATA_TYPES.get(row.get('data_type'))
+    if data_type is None or (data_types and data_type not in data_types):
+        return None
+    return data_type
+
+
+def iter_json_foods(fileobj, data_types):
+    for food in iter_json_array(fileobj):
+        data_type = food.get('dataType', '')
+        if data_types and data_type not in data_types:
+            continue
+        values = extract_nutrients(food.get('foodNutrients', []))
+        yield food_row(food.get('fdcId'), food.get('description', ''), data_type, values)
+
+
+def iter_json_array(fileobj, chunk_size=1 << 20):
+    """Yield the items of the top-level food list in an FDC JSON download one at a time"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while '[' not in buffer:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            return
+        buffer += chunk
+    pos = buffer.index('[') + 1
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            if pos >= len(buffer):
+                raise json.JSONDecodeError('Incomplete item', buffer, pos)
+            item, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # The item continues past the end of the buffer; read more and retry
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                raise CommandError('Unexpected end of JSON download')
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+        if pos >= chunk_size:
+            buffer = buffer[pos:]
+            pos = 0
+
+
+def record_nutrient(nutrients, fdc_id, nutrient_id, amount):
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        return
+    values = nutrients.setdefault(fdc_id, {})
+    field, priority = USDA_NUTRIENTS[nutrient_id]
+    if field not in values or priority < values[field][0]:
+        values[field] = (priority, amount)
+
+
+def food_row(fdc_id, description, data_type, values):
+    """Build FoodItem values from {nutrient field: amount}"""
+    row = {
+        'fdc_id': str(fdc_id),
+        'name': description[:255],
+        'data_type': data_type[:50],
+    }
+    for column in COLUMNS:
+        row[column] = float(values.get(column.removesuffix('_per_100g'), 0))
+    return row
@@ -0,0 +1,56 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from users.models import FoodDiaryVersion, FoodEntryTombstone
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete tombstones of food entries deleted more than FOOD_SYNC_TOMBSTONE_DAYS ago. Clients '
+        'whose sync token predates a pruned tombstone are told to do a full sync.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.FOOD_SYNC_TOMBSTONE_DAYS,
+            help='Keep tombstones younger than this many days'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Tombstones deleted per transaction')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--days must not be negative and --batch-size must be positive')
+        cutoff = timezone.now() - datetime.timedelta(days=options['days'])
+        table = FoodEntryTombstone._meta.db_table
+
+        total = 0
+        while True:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'DELETE FROM {table} WHERE id IN ('
+                        f'SELECT id FROM {table} WHERE deleted_at < %s ORDER BY id LIMIT %s'
+                        f') RETURNING user_id, sync_seq',
+                        [cutoff, options['batch_size']]
+                    )
+                    rows = cursor.fetchall()
+                pruned_through = {}
+                for user_id, sync_seq in rows:
+                    pruned_through[user_id] = max(sync_seq, pruned_through.get(user_id, 0))
+                # Sync tokens from before these versions can no longer see every deletion
+                for user_id, sync_seq in sorted(pruned_through.items()):
+                    FoodDiaryVersion.objects.filter(user_id=user_id).update(
+                        pruned_through=Greatest('pruned_through', sync_seq)
+                    )
+            total += len(rows)
+            if len(rows) < options['batch_size']:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f"Pruned {total} tombstones older than {options['days']} days"))
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import CustomUser, DailyNutritionSummary
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute DailyNutritionSummary rows from FoodEntry, a chunk of users per transaction. '
+        'Run after deploying the table, or to clear float drift from incremental updates.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            nargs='+',
+            help='Only rebuild these user ids (default: every user)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Users rebuilt per transaction; their diary writes wait while it runs'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        users = CustomUser.objects.order_by('pk')
+        if options['users']:
+            users = users.filter(pk__in=options['users'])
+
+        started = time.perf_counter()
+        user_count = summary_count = 0
+        last_pk = 0
+        while True:
+            # Keyset over user ids, so later chunks cost the same as the first
+            chunk = list(users.filter(pk__gt=last_pk).values_list('pk', flat=True)[:chunk_size])
+            if not chunk:
+                break
+            summary_count += DailyNutritionSummary.rebuild(chunk)
+            user_count += len(chunk)
+            last_pk = chunk[-1]
+            self.stdout.write(f"Rebuilt {user_count} users, {summary_count} summaries")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {summary_count} summaries for {user_count} users "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
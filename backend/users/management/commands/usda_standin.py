@@ -0,0 +1,314 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import time
+from collections import Counter
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+BASE_PATH = '/fdc/v1'
+FOOD_PATH = re.compile(r'^/food/(\d+)$')
+
+
+def parse_latency(spec):
+    """Parse a latency distribution in milliseconds, e.g. 'constant:200' or 'lognormal:150,0.5'"""
+    name, _, args = spec.partition(':')
+    distributions = {
+        'constant': (1, lambda rng, ms: ms),
+        'uniform': (2, lambda rng, low, high: rng.uniform(low, high)),
+        'normal': (2, lambda rng, mean, stddev: max(0.0, rng.gauss(mean, stddev))),
+        'lognormal': (2, lambda rng, median, sigma: rng.lognormvariate(math.log(median), sigma)),
+        'exponential': (1, lambda rng, mean: rng.expovariate(1 / mean)),
+    }
+    if name not in distributions:
+        raise argparse.ArgumentTypeError(
+            f"Unknown latency distribution '{name}', expected one of {', '.join(distributions)}"
+        )
+    arity, sample = distributions[name]
+    try:
+        values = [float(value) for value in args.split(',')] if args else []
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Latency parameters must be numbers: '{spec}'")
+    if len(values) != arity or any(value < 0 for value in values):
+        raise argparse.ArgumentTypeError(
+            f"'{name}' takes {arity} non-negative parameter(s) in milliseconds: '{spec}'"
+        )
+    if name in ('lognormal', 'exponential') and values[0] == 0:
+        raise argparse.ArgumentTypeError(f"'{name}' needs a positive first parameter: '{spec}'")
+    return lambda rng: sample(rng, *values) / 1000
+
+
+def parse_rate_limit(spec):
+    """Parse a rate limit such as '1000/3600' (requests per seconds)"""
+    try:
+        requests_allowed, _, seconds = spec.partition('/')
+        requests_allowed, seconds = int(requests_allowed), float(seconds or 3600)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Rate limit must look like REQUESTS/SECONDS: '{spec}'")
+    if requests_allowed <= 0 or seconds <= 0:
+        raise argparse.ArgumentTypeError(f"Rate limit must be positive: '{spec}'")
+    return requests_allowed, seconds
+
+
+class FixtureStore:
+    """Recorded USDA responses on disk, one JSON file per distinct request"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.fixtures = {}
+        os.makedirs(directory, exist_ok=True)
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.json'):
+                with open(os.path.join(directory, filename), encoding='utf-8') as fileobj:
+                    fixture = json.load(fileobj)
+                request = fixture['request']
+                self.fixtures[self.key(request['method'], request['path'], request['params'], request['body'])] = fixture
+
+    @staticmethod
+    def key(method, path, params, body):
+        """Identify a request by everything except the API key"""
+        params = sorted([name, value] for name, value in params if name != 'api_key')
+        return hashlib.sha1(json.dumps([method, path, params, body], sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get(self, method, path, params, body):
+        return self.fixtures.get(self.key(method, path, params, body))
+
+    def save(self, method, path, params, body, status, response_body):
+        params = sorted([name, value] for name, value in params if name != 'api_key')
+        key = self.key(method, path, params, body)
+        fixture = {
+            'request': {'method': method, 'path': path, 'params': params, 'body': body},
+            'status': status,
+            'body': response_body,
+        }
+        self.fixtures[key] = fixture
+        slug = re.sub(r'[^a-z0-9]+', '-', path.lower()).strip('-')
+        with open(os.path.join(self.directory, f"{slug}-{key[:12]}.json"), 'w', encoding='utf-8') as fileobj:
+            json.dump(fixture, fileobj, indent=1)
+
+    def __len__(self):
+        return len(self.fixtures)
+
+
+class RateLimiter:
+    """Token bucket per API key, like the api.data.gov gateway in front of FoodData Central"""
+
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.rate = limit / period
+        self.buckets = {}  # api_key -> (tokens, updated_at)
+
+    def acquire(self, api_key):
+        """Take a token; return (allowed, remaining, seconds until the next token)"""
+        now = time.monotonic()
+        tokens, updated_at = self.buckets.get(api_key, (self.limit, now))
+        tokens = min(self.limit, tokens + (now - updated_at) * self.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self.buckets[api_key] = (tokens, now)
+        return allowed, int(tokens), math.ceil((1 - tokens) / self.rate) if not allowed else 0
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve the USDA FoodData Central endpoints the app uses from recorded fixtures, with '
+        'simulated latency, errors and rate limiting. Point USDA_API_BASE_URL at '
+        f'http://HOST:PORT{BASE_PATH} to use it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--fixtures',
+            default=os.path.join(settings.BASE_DIR, 'usda_fixtures'),
+            help='Directory holding the recorded responses'
+        )
+        parser.add_argument(
+            '--latency',
+            type=parse_latency,
+            default='constant:0',
+            help="Response delay distribution in ms: constant:MS, uniform:LOW,HIGH, normal:MEAN,STDDEV, "
+                 "lognormal:MEDIAN,SIGMA or exponential:MEAN"
+        )
+        parser.add_argument(
+            '--error-rate',
+            type=float,
+            default=0.0,
+            help='Fraction of requests answered with --error-status'
+        )
+        parser.add_argument('--error-status', type=int, default=503)
+        parser.add_argument(
+            '--rate-limit',
+            type=parse_rate_limit,
+            help='Requests allowed per API key, e.g. 1000/3600 like the real API; excess gets HTTP 429'
+        )
+        parser.add_argument(
+            '--record',
+            action='store_true',
+            help='Fetch requests missing from the fixtures from the real API and save them'
+        )
+        parser.add_argument(
+            '--upstream',
+            default='https://api.nal.usda.gov/fdc/v1',
+            help='API recorded from in --record mode'
+        )
+        parser.add_argument('--seed', type=int, help='Seed for repeatable latency and error sampling')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['error_rate'] <= 1:
+            raise CommandError('--error-rate must be between 0 and 1')
+        if options['record'] and not settings.USDA_API_KEY:
+            raise CommandError('--record needs USDA_API_KEY for the real API')
+
+        self.options = options
+        self.store = FixtureStore(options['fixtures'])
+        self.rng = random.Random(options['seed'])
+        self.limiter = RateLimiter(*options['rate_limit']) if options['rate_limit'] else None
+        self.session = requests.Session() if options['record'] else None
+        self.statuses = Counter()
+
+        self.stdout.write(
+            f"Serving {len(self.store)} USDA fixtures from {options['fixtures']} on "
+            f"http://{options['host']}:{options['port']}{BASE_PATH}"
+            + (f", recording misses from {options['upstream']}" if options['record'] else '')
+        )
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stdout.write(f"Responses by status: {dict(sorted(self.statuses.items()))}")
+
+    async def serve(self):
+        server = await asyncio.start_server(
+            self.handle_connection, self.options['host'], self.options['port'], backlog=1024
+        )
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                body = await reader.readexactly(length) if length else b''
+
+                status, payload, extra_headers = await self.respond(method, target, body)
+                self.statuses[status] += 1
+                content = json.dumps(payload).encode('utf-8')
+                head = [f"HTTP/1.1 {status} {STATUS_REASONS.get(status, 'Error')}",
+                        'Content-Type: application/json',
+                        f"Content-Length: {len(content)}"]
+                head += [f"{name}: {value}" for name, value in extra_headers.items()]
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + content)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, target, body):
+        url = urlsplit(target)
+        if not url.path.startswith(BASE_PATH):
+            return 404, {'error': f'Not found: {url.path}'}, {}
+        path = url.path[len(BASE_PATH):]
+        params = parse_qsl(url.query, keep_blank_values=True)
+        api_key = dict(params).get('api_key')
+        if not api_key:
+            return 403, {'error': {'code': 'API_KEY_MISSING', 'message': 'No api_key was supplied.'}}, {}
+
+        headers = {}
+        if self.limiter:
+            allowed, remaining, retry_after = self.limiter.acquire(api_key)
+            headers = {'X-RateLimit-Limit': self.limiter.limit, 'X-RateLimit-Remaining': remaining}
+            if not allowed:
+                return 429, {
+                    'error': {'code': 'OVER_RATE_LIMIT', 'message': 'API rate limit exceeded.'}
+                }, {**headers, 'Retry-After': retry_after}
+
+        try:
+            request_body = json.loads(body) if body else None
+        except ValueError:
+            return 400, {'error': 'Request body is not JSON'}, headers
+        fixture = self.store.get(method, path, params, request_body)
+
+        if fixture is None and self.options['record']:
+            fixture = await asyncio.get_running_loop().run_in_executor(
+                None, self.record, method, path, params, request_body
+            )
+        else:
+            # Recorded responses already took real time upstream; replays get simulated latency
+            await asyncio.sleep(self.options['latency'](self.rng))
+            if self.rng.random() < self.options['error_rate']:
+                status = self.options['error_status']
+                return status, {'error': STATUS_REASONS.get(status, 'Error')}, headers
+
+        if fixture is None:
+            return self.default_response(method, path, request_body) + (headers,)
+        return fixture['status'], fixture['body'], headers
+
+    def record(self, method, path, params, request_body):
+        """Forward a request to the real API and save the answer if it is one worth replaying"""
+        params = [(name, value) for name, value in params if name != 'api_key']
+        response = self.session.request(
+            method,
+            f"{self.options['upstream'].rstrip('/')}{path}",
+            params=[*params, ('api_key', settings.USDA_API_KEY)],
+            json=request_body,
+            timeout=(settings.USDA_HTTP_CONNECT_TIMEOUT, settings.USDA_HTTP_READ_TIMEOUT),
+        )
+        try:
+            response_body = response.json()
+        except ValueError:
+            response_body = {'error': response.text[:500]}
+        # Throttling and outages are simulated on replay rather than recorded
+        if response.status_code in (200, 400, 404):
+            self.store.save(method, path, params, request_body, response.status_code, response_body)
+            self.stdout.write(f"Recorded {method} {path} -> {response.status_code}")
+        return {'status': response.status_code, 'body': response_body}
+
+    @staticmethod
+    def default_response(method, path, request_body):
+        """What the real API answers for a request with no fixture, where that is well defined"""
+        if method == 'GET' and path == '/foods/search':
+            return 200, {'totalHits': 0, 'currentPage': 1, 'totalPages': 0, 'foods': []}
+        if method == 'POST' and path == '/foods':
+            return 200, []
+        if method == 'GET' and FOOD_PATH.match(path):
+            return 404, {'error': 'Not found'}
+        return 404, {'error': f'No fixture for {method} {path}'}
+
+
+STATUS_REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    403: 'Forbidden',
+    404: 'Not Found',
+    429: 'Too Many Requests',
+    500: 'Internal Server Error',
+    502: 'Bad Gateway',
+    503: 'Service Unavailable',
+    504: 'Gateway Timeout',
+}
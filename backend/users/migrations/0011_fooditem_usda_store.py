@@ -0,0 +1,38 @@
+# Generated by Django 5.1.6 on 2026-10-17 00:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_remove_foodentry_food_item_remove_foodentry_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fooditem',
+            name='data_type',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='fooditem',
+            name='fdc_id',
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='fooditem',
+            name='fetched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='fooditem',
+            name='usda_payload',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='fooditem',
+            name='name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-17 00:44
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_fooditem_usda_store'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='fooditem',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.SearchVector('name', config='english'), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='fooditem',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='fooditem_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fooditem',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='fooditem_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
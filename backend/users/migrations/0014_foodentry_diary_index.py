@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_fooditem_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='foodentry',
+            index=models.Index(fields=['user', '-entry_date', '-created_at', '-id'], include=('food_name', 'meal_type', 'number_of_servings', 'serving_size', 'serving_size_unit', 'calories', 'protein', 'fat', 'carbs'), name='foodentry_user_diary_idx'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:30
+
+import django.db.models.expressions
+import django.db.models.functions.text
+import django.db.models.lookups
+from django.db import migrations, models
+
+NUTRIENT_FIELDS = ('calories', 'protein', 'fat', 'carbs')
+# FoodEntry.GRAMS_PER_UNIT as of this migration
+GRAMS_PER_UNIT = {
+    'g': 1, 'kg': 1000, 'oz': 28.3495, 'lb': 453.592, 'cup': 128, 'tbsp': 15, 'tsp': 5,
+    'serving': 100, 'medium': 100, 'large': 150, 'small': 50, 'item': 100, 'egg': 50, 'unit': 100,
+}
+DEFAULT_GRAMS_PER_UNIT = 100
+
+# The SQL Django generates for FoodEntry.SERVING_MULTIPLIER
+SERVING_MULTIPLIER_SQL = '((("serving_size" * CASE {} ELSE {} END) / 100.0) * "number_of_servings")'.format(
+    ' '.join(
+        f"""WHEN LOWER("serving_size_unit") = '{unit}' THEN {float(grams)}"""
+        for unit, grams in GRAMS_PER_UNIT.items()
+    ),
+    float(DEFAULT_GRAMS_PER_UNIT),
+)
+
+# Adding a stored generated column rewrites users_foodentry under an ACCESS EXCLUSIVE lock,
+# which blocks every diary read and write until the migration commits. One AddField per
+# column would rewrite the table four times; a single ALTER TABLE adding all four rewrites it
+# once. Expect the lock to be held for roughly one full copy of the table plus the diary index
+# build below, so run this in a maintenance window on large deployments.
+ADD_TOTAL_COLUMNS_SQL = 'ALTER TABLE "users_foodentry" ' + ', '.join(
+    f'ADD COLUMN "total_{nutrient}" double precision '
+    f'GENERATED ALWAYS AS (("{nutrient}" * {SERVING_MULTIPLIER_SQL})) STORED'
+    for nutrient in NUTRIENT_FIELDS
+)
+DROP_TOTAL_COLUMNS_SQL = 'ALTER TABLE "users_foodentry" ' + ', '.join(
+    f'DROP COLUMN "total_{nutrient}"' for nutrient in NUTRIENT_FIELDS
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0016_food_entry_sync'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='foodentry',
+            name='foodentry_user_diary_idx',
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(ADD_TOTAL_COLUMNS_SQL, DROP_TOTAL_COLUMNS_SQL),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='foodentry',
+                    name='total_calories',
+                    field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('calories'), '*', django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('serving_size'), '*', models.Case(models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'g'), then=models.Value(1.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'kg'), then=models.Value(1000.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'oz'), then=models.Value(28.3495)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'lb'), then=models.Value(453.592)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'cup'), then=models.Value(128.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'tbsp'), then=models.Value(15.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'tsp'), then=models.Value(5.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'serving'), then=models.Value(100.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'medium'), then=models.Value(100.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'large'), then=models.Value(150.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'small'), then=models.Value(50.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'item'), then=models.Value(100.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'egg'), then=models.Value(50.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'unit'), then=models.Value(100.0)), default=models.Value(100.0), output_field=models.FloatField())), '/', models.Value(100.0)), '*', models.F('number_of_servings'))), output_field=models.FloatField()),
+                ),
+                migrations.AddField(
+                    model_name='foodentry',
+                    name='total_carbs',
+                    field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('carbs'), '*', django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('serving_size'), '*', models.Case(models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'g'), then=models.Value(1.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'kg'), then=models.Value(1000.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'oz'), then=models.Value(28.3495)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'lb'), then=models.Value(453.592)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'cup'), then=models.Value(128.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'tbsp'), then=models.Value(15.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'tsp'), then=models.Value(5.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'serving'), then=models.Value(100.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'medium'), then=models.Value(100.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'large'), then=models.Value(150.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'small'), then=models.Value(50.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'item'), then=models.Value(100.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'egg'), then=models.Value(50.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'unit'), then=models.Value(100.0)), default=models.Value(100.0), output_field=models.FloatField())), '/', models.Value(100.0)), '*', models.F('number_of_servings'))), output_field=models.FloatField()),
+                ),
+                migrations.AddField(
+                    model_name='foodentry',
+                    name='total_fat',
+                    field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('fat'), '*', django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('serving_size'), '*', models.Case(models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'g'), then=models.Value(1.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'kg'), then=models.Value(1000.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'oz'), then=models.Value(28.3495)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'lb'), then=models.Value(453.592)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'cup'), then=models.Value(128.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'tbsp'), then=models.Value(15.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'tsp'), then=models.Value(5.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'serving'), then=models.Value(100.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'medium'), then=models.Value(100.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'large'), then=models.Value(150.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'small'), then=models.Value(50.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'item'), then=models.Value(100.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'egg'), then=models.Value(50.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'unit'), then=models.Value(100.0)), default=models.Value(100.0), output_field=models.FloatField())), '/', models.Value(100.0)), '*', models.F('number_of_servings'))), output_field=models.FloatField()),
+                ),
+                migrations.AddField(
+                    model_name='foodentry',
+                    name='total_protein',
+                    field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('protein'), '*', django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('serving_size'), '*', models.Case(models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'g'), then=models.Value(1.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'kg'), then=models.Value(1000.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'oz'), then=models.Value(28.3495)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'lb'), then=models.Value(453.592)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'cup'), then=models.Value(128.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'tbsp'), then=models.Value(15.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'tsp'), then=models.Value(5.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'serving'), then=models.Value(100.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'medium'), then=models.Value(100.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'large'), then=models.Value(150.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'small'), then=models.Value(50.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'item'), then=models.Value(100.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'egg'), then=models.Value(50.0)), models.When(django.db.models.lookups.Exact(django.db.models.functions.text.Lower('serving_size_unit'), 'unit'), then=models.Value(100.0)), default=models.Value(100.0), output_field=models.FloatField())), '/', models.Value(100.0)), '*', models.F('number_of_servings'))), output_field=models.FloatField()),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='foodentry',
+            index=models.Index(fields=['user', '-entry_date', '-created_at', '-id'], include=('food_name', 'meal_type', 'number_of_servings', 'serving_size', 'serving_size_unit', 'calories', 'protein', 'fat', 'carbs', 'total_calories', 'total_protein', 'total_fat', 'total_carbs'), name='foodentry_user_diary_idx'),
+        ),
+    ]
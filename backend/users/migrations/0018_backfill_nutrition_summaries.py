@@ -0,0 +1,66 @@
+from django.db import migrations, transaction
+from django.db.models import Count, Sum
+
+NUTRIENT_FIELDS = ('calories', 'protein', 'fat', 'carbs')
+CHUNK_SIZE = 500
+
+
+def backfill_nutrition_summaries(apps, schema_editor):
+    """Recompute every user's DailyNutritionSummary rows, a chunk of users per transaction.
+
+    The same work as DailyNutritionSummary.rebuild, which a migration cannot call. Summary
+    reads switched to this table in 0015, so until it is filled past days read as empty, and
+    rows written since then only cover entries changed since.
+    """
+    CustomUser = apps.get_model('users', 'CustomUser')
+    FoodEntry = apps.get_model('users', 'FoodEntry')
+    DailyNutritionSummary = apps.get_model('users', 'DailyNutritionSummary')
+    db = schema_editor.connection.alias
+
+    last_pk = 0
+    while True:
+        with transaction.atomic(using=db):
+            # Locking the users holds back their diary writes until the chunk is rebuilt
+            chunk = list(
+                CustomUser.objects.using(db).select_for_update()
+                .filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:CHUNK_SIZE]
+            )
+            if not chunk:
+                break
+            DailyNutritionSummary.objects.using(db).filter(user_id__in=chunk).delete()
+            rows = (
+                FoodEntry.objects.using(db).filter(user_id__in=chunk)
+                .values('user_id', 'entry_date', 'meal_type')
+                .annotate(
+                    entry_count=Count('id'),
+                    **{f'sum_{nutrient}': Sum(f'total_{nutrient}') for nutrient in NUTRIENT_FIELDS}
+                )
+                .order_by()
+            )
+            DailyNutritionSummary.objects.using(db).bulk_create(
+                (
+                    DailyNutritionSummary(
+                        user_id=row['user_id'],
+                        date=row['entry_date'],
+                        meal_type=row['meal_type'],
+                        entry_count=row['entry_count'],
+                        **{nutrient: row[f'sum_{nutrient}'] for nutrient in NUTRIENT_FIELDS}
+                    )
+                    for row in rows
+                ),
+                batch_size=1000
+            )
+        last_pk = chunk[-1]
+
+
+class Migration(migrations.Migration):
+    # Each chunk commits on its own, so a large backfill does not hold every user's lock at once
+    atomic = False
+
+    dependencies = [
+        ('users', '0017_foodentry_nutrient_totals'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_nutrition_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0018_backfill_nutrition_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foodentry',
+            name='client_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='foodentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('client_id__isnull', False)), fields=('user', 'client_id'), name='foodentry_user_client_id_uniq'),
+        ),
+    ]
@@ -1,9 +1,16 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Lower
+from django.db.models.lookups import Exact
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.models import BaseUserManager
 from django.utils import timezone
 import datetime
+import json
+import zlib
 
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -67,17 +74,113 @@ class CustomUser(AbstractUser):
         super().save(*args, **kwargs)  # Call the original save method
         
 class FoodItem(models.Model):
-    name = models.CharField(max_length=255, unique=True)
+    fdc_id = models.CharField(max_length=50, unique=True, null=True, blank=True)  # USDA FoodData Central ID
+    name = models.CharField(max_length=255, db_index=True)
+    data_type = models.CharField(max_length=50, blank=True, default='')
     calories_per_100g = models.FloatField()
     carbs_per_100g = models.FloatField(default=0)
     fat_per_100g = models.FloatField(default=0)
     protein_per_100g = models.FloatField(default=0)
+    usda_payload = models.BinaryField(null=True, blank=True)  # zlib-compressed USDA JSON response
+    fetched_at = models.DateTimeField(null=True, blank=True)  # When the USDA data was last fetched
+    search_vector = models.GeneratedField(
+        expression=SearchVector('name', config='english'),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Indexed for incremental index syncs
+
+    class Meta:
+        indexes = [
+            # Full-text search over the generated tsvector
+            GinIndex(fields=['search_vector'], name='fooditem_search_vector_idx'),
+            # Fuzzy and partial-word matching on the name
+            GinIndex(fields=['name'], name='fooditem_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def store_usda_food(cls, fdc_id, food_details, payload=None):
+        """Insert or refresh the locally stored copy of a USDA food"""
+        defaults = cls.usda_fields(food_details, payload)
+        food_item, _ = cls.objects.update_or_create(fdc_id=str(fdc_id), defaults=defaults)
+        return food_item
+
+    @classmethod
+    def store_usda_foods(cls, foods):
+        """Insert or refresh several (fdc_id, food_details, payload) USDA foods in one statement"""
+        food_items = {
+            str(fdc_id): cls(fdc_id=str(fdc_id), **cls.usda_fields(food_details, payload))
+            for fdc_id, food_details, payload in foods
+        }
+        # bulk_create skips post_save; the autocomplete index picks these up through updated_at
+        cls.objects.bulk_create(
+            list(food_items.values()),
+            update_conflicts=True,
+            unique_fields=['fdc_id'],
+            update_fields=[
+                'name', 'data_type', 'calories_per_100g', 'protein_per_100g', 'fat_per_100g',
+                'carbs_per_100g', 'usda_payload', 'fetched_at', 'updated_at',
+            ],
+        )
+
+    @classmethod
+    def usda_fields(cls, food_details, payload=None):
+        """Model field values for a parsed USDA food and its raw response"""
+        nutrients = food_details['nutrients']
+        return {
+            'name': food_details['name'][:255],
+            'data_type': (payload or {}).get('dataType', '')[:50],
+            'calories_per_100g': nutrients['calories'],
+            'protein_per_100g': nutrients['protein'],
+            'fat_per_100g': nutrients['fat'],
+            'carbs_per_100g': nutrients['carbs'],
+            'usda_payload': cls.compress_payload(payload) if payload is not None else None,
+            'fetched_at': timezone.now(),
+        }
+
+    @staticmethod
+    def compress_payload(payload):
+        """Serialize and compress a USDA response for storage"""
+        return zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+
+    def get_usda_payload(self):
+        """Return the decompressed USDA response, if one was stored"""
+        if not self.usda_payload:
+            return None
+        return json.loads(zlib.decompress(self.usda_payload))
+
+    def is_fresh(self):
+        """Check whether the stored USDA data is still within its TTL"""
+        if self.fetched_at is None:
+            return False
+        ttl = datetime.timedelta(seconds=settings.USDA_FOOD_CACHE_TTL)
+        return timezone.now() - self.fetched_at < ttl
+
+    def is_servable(self):
+        """Check whether stored USDA data may be served, stale, while it is refreshed"""
+        if self.fetched_at is None:
+            return False
+        max_age = datetime.timedelta(
+            seconds=settings.USDA_FOOD_CACHE_TTL + settings.USDA_FOOD_MAX_STALENESS
+        )
+        return timezone.now() - self.fetched_at < max_age
+
+    def to_food_details(self):
+        """Return the stored data in the shape produced by get_food_details"""
+        return {
+            'name': self.name,
+            'nutrients': {
+                'calories': self.calories_per_100g,
+                'protein': self.protein_per_100g,
+                'fat': self.fat_per_100g,
+                'carbs': self.carbs_per_100g
+            }
+        }
+
     def get_nutrients_for_serving(self, serving_size, serving_unit='g'):
         # Convert serving size to grams
         grams = self.convert_to_grams(serving_size, serving_unit)
@@ -113,6 +216,38 @@ class FoodEntry(models.Model):
         ('Snack', 'Snack'),
     ]
 
+    # Grams per serving_size_unit, shared by convert_to_grams and SERVING_MULTIPLIER
+    GRAMS_PER_UNIT = {
+        'g': 1,
+        'kg': 1000,
+        'oz': 28.3495,
+        'lb': 453.592,
+        'cup': 128,  # Approximate, varies by food
+        'tbsp': 15,  # Approximate, varies by food
+        'tsp': 5,    # Approximate, varies by food
+        'serving': 100,  # Default serving size
+        'medium': 100,   # Default medium size
+        'large': 150,    # Default large size
+        'small': 50,     # Default small size
+        'item': 100,     # Default item size
+        'egg': 50,       # Average egg size
+        'unit': 100,     # Default unit size
+    }
+    DEFAULT_GRAMS_PER_UNIT = 100  # Used for units missing from GRAMS_PER_UNIT
+    NUTRIENT_FIELDS = ('calories', 'protein', 'fat', 'carbs')
+    TOTAL_NUTRIENT_FIELDS = tuple(f'total_{nutrient}' for nutrient in NUTRIENT_FIELDS)
+
+    # SQL expression for the multiplier get_total_nutrients applies to the per-100g values.
+    # Changing GRAMS_PER_UNIT changes the total_* columns, so needs a migration.
+    SERVING_MULTIPLIER = F('serving_size') * Case(
+        *[
+            When(Exact(Lower('serving_size_unit'), unit), then=Value(float(grams)))
+            for unit, grams in GRAMS_PER_UNIT.items()
+        ],
+        default=Value(float(DEFAULT_GRAMS_PER_UNIT)),
+        output_field=FloatField()
+    ) / Value(100.0) * F('number_of_servings')
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='food_entries')
     food_name = models.CharField(max_length=255, default='Unknown Food')
     fdc_id = models.CharField(max_length=50, null=True, blank=True)  # USDA FoodData Central ID
@@ -124,38 +259,65 @@ class FoodEntry(models.Model):
     protein = models.FloatField(default=0)   # Stored as per 100g
     fat = models.FloatField(default=0)       # Stored as per 100g
     carbs = models.FloatField(default=0)     # Stored as per 100g
+    # Nutrients as eaten, computed by Postgres whenever the row is written
+    total_calories = models.GeneratedField(
+        expression=F('calories') * SERVING_MULTIPLIER, output_field=models.FloatField(), db_persist=True
+    )
+    total_protein = models.GeneratedField(
+        expression=F('protein') * SERVING_MULTIPLIER, output_field=models.FloatField(), db_persist=True
+    )
+    total_fat = models.GeneratedField(
+        expression=F('fat') * SERVING_MULTIPLIER, output_field=models.FloatField(), db_persist=True
+    )
+    total_carbs = models.GeneratedField(
+        expression=F('carbs') * SERVING_MULTIPLIER, output_field=models.FloatField(), db_persist=True
+    )
     entry_date = models.DateField(default=timezone.now)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    # FoodDiaryVersion.version of the write that last touched this entry, for delta sync
+    sync_seq = models.BigIntegerField(default=0)
+    # Id the client gave an entry created offline, so a retried push does not create it again
+    client_id = models.CharField(max_length=64, null=True, blank=True)
 
     class Meta:
         ordering = ['-entry_date', '-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'client_id'],
+                condition=Q(client_id__isnull=False),
+                name='foodentry_user_client_id_uniq',
+            ),
+        ]
+        indexes = [
+            # Delta sync reads a user's entries changed after a (sync_seq, id) position
+            models.Index(fields=['user', 'sync_seq', 'id'], name='foodentry_user_sync_idx'),
+            # Diary reads filter by user (and usually date) in this order, and read only these
+            # columns, so Postgres can answer them with an index-only scan and no sort
+            models.Index(
+                fields=['user', '-entry_date', '-created_at', '-id'],
+                name='foodentry_user_diary_idx',
+                include=[
+                    'food_name', 'meal_type', 'number_of_servings', 'serving_size',
+                    'serving_size_unit', 'calories', 'protein', 'fat', 'carbs',
+                    'total_calories', 'total_protein', 'total_fat', 'total_carbs',
+                ],
+            ),
+        ]
 
     def __str__(self):
         return f"{self.food_name} - {self.meal_type} ({self.entry_date})"
 
     def convert_to_grams(self, amount, unit):
         """Convert various units to grams"""
-        conversion_factors = {
-            'g': 1,
-            'kg': 1000,
-            'oz': 28.3495,
-            'lb': 453.592,
-            'cup': 128,  # Approximate, varies by food
-            'tbsp': 15,  # Approximate, varies by food
-            'tsp': 5,    # Approximate, varies by food
-            'serving': 100,  # Default serving size
-            'medium': 100,   # Default medium size
-            'large': 150,    # Default large size
-            'small': 50,     # Default small size
-            'item': 100,     # Default item size
-            'egg': 50,       # Average egg size
-            'unit': 100,     # Default unit size
-        }
-        return amount * conversion_factors.get(unit.lower(), 100)  # Default to 100g if unit unknown
+        return amount * self.GRAMS_PER_UNIT.get(unit.lower(), self.DEFAULT_GRAMS_PER_UNIT)
 
     def get_total_nutrients(self):
-        """Calculate total nutrients based on serving size and unit conversion"""
+        """Calculate total nutrients based on serving size and unit conversion.
+
+        Saved rows hold the same values in the total_* columns; this also works on unsaved
+        entries and edited copies.
+        """
         # Convert the serving size to grams
         total_grams = self.convert_to_grams(self.serving_size, self.serving_size_unit)
         
@@ -167,4 +329,157 @@ class FoodEntry(models.Model):
             'protein': self.protein * multiplier,
             'fat': self.fat * multiplier,
             'carbs': self.carbs * multiplier
-        }
\ No newline at end of file
+        }
+
+class FoodDiaryVersion(models.Model):
+    """Per-user counter bumped by every write to the user's food entries.
+
+    Each write stamps the entries it touches with the new version (FoodEntry.sync_seq), which
+    orders changes for delta sync.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='food_diary_version'
+    )
+    version = models.BigIntegerField(default=0)
+    # Tombstones up to this version have been pruned, so older sync tokens can no longer be served
+    pruned_through = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.version}"
+
+    @classmethod
+    def bump(cls, user_id):
+        """Increment and return the user's version.
+
+        The row stays locked until the transaction ends, so a user's versions become visible
+        in order and a sync reader never sees a later version before an earlier one.
+        """
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, version, pruned_through) VALUES (%s, 1, 0) '
+                f'ON CONFLICT (user_id) DO UPDATE SET version = {table}.version + 1 '
+                f'RETURNING version',
+                [user_id]
+            )
+            return cursor.fetchone()[0]
+
+class FoodEntryTombstone(models.Model):
+    """A deleted FoodEntry, kept so delta sync can tell clients to drop it"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='food_entry_tombstones')
+    entry_id = models.BigIntegerField()
+    sync_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'sync_seq', 'entry_id'], name='tombstone_user_sync_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: entry {self.entry_id} deleted at {self.sync_seq}"
+
+class DailyNutritionSummary(models.Model):
+    """Nutrient totals (as eaten) of a user's food entries for one date and meal_type.
+
+    Rows are kept in step with FoodEntry by record_changes, inside the transaction that writes
+    the entries, and can be recomputed from scratch with rebuild.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='nutrition_summaries')
+    date = models.DateField()
+    meal_type = models.CharField(max_length=20)
+    calories = models.FloatField(default=0)
+    protein = models.FloatField(default=0)
+    fat = models.FloatField(default=0)
+    carbs = models.FloatField(default=0)
+    entry_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date', 'meal_type'], name='nutritionsummary_user_day_meal'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.date} {self.meal_type}: {self.calories:.0f} kcal"
+
+    @staticmethod
+    def lock_users(user_ids, no_key=False):
+        """Serialize summary writes per user until the current transaction ends.
+
+        record_changes takes a NO KEY UPDATE lock, so concurrent writes for one user apply their
+        deltas in turn; rebuild takes a full UPDATE lock, which also waits for new entries (their
+        foreign key check needs a KEY SHARE lock on the user) to commit.
+        """
+        list(
+            CustomUser.objects.select_for_update(no_key=no_key)
+            .filter(pk__in=user_ids)
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+
+    @classmethod
+    def record_changes(cls, added=(), removed=()):
+        """Apply the totals of added and removed FoodEntry states to the summaries.
+
+        Call inside the transaction that saves the entries. An edited entry is passed twice:
+        its state before the edit as removed and after it as added, so changing its date,
+        meal or serving moves its totals between rows.
+        """
+        deltas = {}
+        for sign, entries in ((1, added), (-1, removed)):
+            for entry in entries:
+                delta = deltas.setdefault(
+                    (entry.user_id, entry.entry_date, entry.meal_type),
+                    dict.fromkeys(FoodEntry.NUTRIENT_FIELDS + ('entry_count',), 0)
+                )
+                for nutrient, amount in entry.get_total_nutrients().items():
+                    delta[nutrient] += sign * amount
+                delta['entry_count'] += sign
+        if not deltas:
+            return
+
+        cls.lock_users({user_id for user_id, _, _ in deltas}, no_key=True)
+        now = timezone.now()
+        touched = []
+        for (user_id, date, meal_type), delta in deltas.items():
+            if not any(delta.values()):
+                continue
+            summary, _ = cls.objects.get_or_create(user_id=user_id, date=date, meal_type=meal_type)
+            cls.objects.filter(pk=summary.pk).update(
+                updated_at=now,
+                **{name: F(name) + amount for name, amount in delta.items()}
+            )
+            touched.append(summary.pk)
+        # A day's last entry for a meal leaves a row of float rounding noise; drop it
+        cls.objects.filter(pk__in=touched, entry_count__lte=0).delete()
+
+    @classmethod
+    def rebuild(cls, user_ids):
+        """Recompute the given users' summaries from their food entries, in one transaction"""
+        with transaction.atomic():
+            cls.lock_users(user_ids)
+            cls.objects.filter(user_id__in=user_ids).delete()
+            rows = (
+                FoodEntry.objects.filter(user_id__in=user_ids)
+                .values('user_id', 'entry_date', 'meal_type')
+                .annotate(
+                    entry_count=Count('id'),
+                    **{f'sum_{nutrient}': Sum(f'total_{nutrient}') for nutrient in FoodEntry.NUTRIENT_FIELDS}
+                )
+                .order_by()
+            )
+            summaries = cls.objects.bulk_create(
+                (
+                    cls(
+                        user_id=row['user_id'],
+                        date=row['entry_date'],
+                        meal_type=row['meal_type'],
+                        entry_count=row['entry_count'],
+                        **{nutrient: row[f'sum_{nutrient}'] for nutrient in FoodEntry.NUTRIENT_FIELDS}
+                    )
+                    for row in rows
+                ),
+                batch_size=1000
+            )
+        return len(summaries)
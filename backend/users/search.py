@@ -0,0 +1,44 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db.models import F, Q
+
+from .models import FoodItem
+from .usda import USDA_DATA_TYPES
+
+
+def build_search_query(query):
+    """Build a tsquery matching every word, treating the last one as a prefix"""
+    terms = re.findall(r'\w+', query.casefold())
+    if not terms:
+        return None
+    terms[-1] = f"{terms[-1]}:*"
+    return SearchQuery(' & '.join(terms), search_type='raw', config='english')
+
+
+def search_local_foods(query, data_types=None, limit=50, offset=0):
+    """Rank FoodItem rows by full-text relevance plus trigram similarity"""
+    search_query = build_search_query(query)
+    if search_query is None:
+        return []
+
+    items = (
+        FoodItem.objects
+        .filter(fdc_id__isnull=False)
+        .filter(Q(search_vector=search_query) | Q(name__trigram_word_similar=query))
+        .annotate(rank=SearchRank(F('search_vector'), search_query) + TrigramWordSimilarity(query, 'name'))
+        .order_by('-rank', 'name')
+        .only('fdc_id', 'name', 'data_type')
+    )
+    if data_types:
+        items = items.filter(data_type__in=data_types)
+
+    return [{
+        'fdc_id': item.fdc_id,
+        'name': item.name,
+        'brand': '',
+        'data_type': item.data_type,
+        'data_type_description': USDA_DATA_TYPES.get(item.data_type, ''),
+        'serving_size': 100,
+        'serving_size_unit': 'g'
+    } for item in items[offset:offset + limit]]
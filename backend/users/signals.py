@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .autocomplete import food_index
+from .models import FoodEntry, FoodItem
+
+
+@receiver(post_save, sender=FoodItem)
+def index_food_item(sender, instance, **kwargs):
+    """Keep this process's autocomplete index in step with catalog edits"""
+    if food_index.built_at is not None and instance.fdc_id:
+        food_index.upsert(instance.fdc_id, instance.name)
+
+
+@receiver(post_delete, sender=FoodItem)
+def unindex_food_item(sender, instance, **kwargs):
+    if food_index.built_at is not None and instance.fdc_id:
+        food_index.remove(instance.fdc_id)
+
+
+@receiver(post_save, sender=FoodEntry)
+def bump_food_popularity(sender, instance, created, **kwargs):
+    """Logged foods rank higher in autocomplete"""
+    if created:
+        bump_logged_foods([instance])
+
+
+def bump_logged_foods(food_entries):
+    """Count newly logged entries towards autocomplete popularity.
+
+    bulk_create does not send post_save, so views that bulk create entries call this directly.
+    """
+    if food_index.built_at is None:
+        return
+    for food_entry in food_entries:
+        if food_entry.fdc_id:
+            food_index.bump(food_entry.fdc_id)
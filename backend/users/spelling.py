@@ -0,0 +1,236 @@
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max
+
+logger = logging.getLogger(__name__)
+
+# Words are corrected by at most this many edits; short words by fewer
+MAX_EDIT_DISTANCE = 2
+SHORT_WORD_LENGTH = 4
+# Deletes are only generated for this many leading characters, which bounds the index
+# size while barely affecting which corrections are found
+PREFIX_LENGTH = 7
+# Shorter words are too ambiguous to correct, and are not indexed
+MIN_WORD_LENGTH = 3
+# Below this many words the catalog is a partial vocabulary (e.g. only foods cached from
+# USDA lookups), and valid words missing from it would be "corrected" into other foods
+MIN_VOCABULARY = 1000
+# How often a worker checks whether the index file on disk, or without one the catalog, has changed
+RELOAD_CHECK_INTERVAL = 60
+FORMAT_VERSION = 1
+
+
+def tokenize(text):
+    return re.findall(r'\w+', text.casefold())
+
+
+def edit_distance(a, b, max_distance):
+    """Optimal string alignment distance, or max_distance + 1 once it is exceeded"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+def deletes(word, max_distance):
+    """Every string reachable from word's prefix by deleting up to max_distance characters"""
+    results = {word[:PREFIX_LENGTH]}
+    frontier = results
+    for _ in range(max_distance):
+        frontier = {
+            candidate[:i] + candidate[i + 1:]
+            for candidate in frontier
+            if len(candidate) > 1
+            for i in range(len(candidate))
+        }
+        results |= frontier
+    return results
+
+
+class SpellingIndex:
+    """Symmetric-delete (SymSpell) spelling index over the food catalog vocabulary"""
+
+    def __init__(self):
+        self._words = {}  # word -> number of catalog names using it
+        self._deletes = {}  # delete -> words it was generated from
+        self.built_at = None
+
+    def build(self, names):
+        """Replace the vocabulary with the words of the given food names"""
+        counts = Counter()
+        for name in names:
+            counts.update({
+                word for word in tokenize(name)
+                if len(word) >= MIN_WORD_LENGTH and word.isalpha()
+            })
+        index = {}
+        for word in counts:
+            for delete in deletes(word, MAX_EDIT_DISTANCE):
+                index.setdefault(delete, []).append(word)
+        self._words = dict(counts)
+        self._deletes = index
+        self.built_at = time.time()
+
+    def lookup(self, word):
+        """Return the most common catalog word closest to word, or None if nothing is close"""
+        if word in self._words:
+            return word
+        max_distance = 1 if len(word) <= SHORT_WORD_LENGTH else MAX_EDIT_DISTANCE
+        best = None
+        best_key = None
+        checked = set()
+        for delete in deletes(word, max_distance):
+            for candidate in self._deletes.get(delete, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                distance = edit_distance(word, candidate, max_distance)
+                if distance > max_distance:
+                    continue
+                key = (distance, -self._words[candidate], candidate)
+                if best_key is None or key < best_key:
+                    best, best_key = candidate, key
+        return best
+
+    def correct(self, query):
+        """Return query with unknown words replaced by their corrections, or None if unchanged"""
+        if len(self._words) < MIN_VOCABULARY:
+            return None
+        words = tokenize(query)
+        corrected = []
+        for word in words:
+            if len(word) < MIN_WORD_LENGTH or not word.isalpha():
+                corrected.append(word)
+            else:
+                corrected.append(self.lookup(word) or word)
+        if corrected == words:
+            return None
+        return ' '.join(corrected)
+
+    def save(self, path):
+        """Write the index to path, replacing any previous file atomically"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as fileobj:
+            pickle.dump(
+                {'version': FORMAT_VERSION, 'words': self._words, 'deletes': self._deletes},
+                fileobj,
+                protocol=pickle.HIGHEST_PROTOCOL
+            )
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """Load an index written by save(); the file must come from build_spelling_index"""
+        with open(path, 'rb') as fileobj:
+            data = pickle.load(fileobj)
+        if data.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported spelling index format in {path}")
+        self._words = data['words']
+        self._deletes = data['deletes']
+        self.built_at = os.path.getmtime(path)
+
+    def stats(self):
+        return {
+            'words': len(self._words),
+            'deletes': len(self._deletes),
+            'built_at': self.built_at,
+        }
+
+
+def build_spelling_index():
+    """Build a SpellingIndex from the FoodItem catalog"""
+    from .models import FoodItem
+
+    index = SpellingIndex()
+    index.build(FoodItem.objects.values_list('name', flat=True).iterator(chunk_size=5000))
+    return index
+
+
+spelling_index = None
+_refresh_lock = threading.Lock()
+_checked_at = None
+_catalog_version = None  # Latest FoodItem.updated_at when the in-memory index was built
+
+
+def get_spelling_index():
+    """Return the process-wide index, or None until the worker's first load or build finishes.
+
+    Every RELOAD_CHECK_INTERVAL a background thread reloads SPELLING_INDEX_PATH if the file has
+    changed or, without a usable file, rebuilds the index if the catalog has changed since the
+    last build. Requests never wait for either.
+    """
+    global _checked_at
+    now = time.monotonic()
+    refresh_due = _checked_at is None or now - _checked_at >= RELOAD_CHECK_INTERVAL
+    if refresh_due and _refresh_lock.acquire(blocking=False):
+        _checked_at = now
+        threading.Thread(target=_refresh_in_background, daemon=True).start()
+    return spelling_index
+
+
+def _refresh_in_background():
+    global spelling_index, _catalog_version
+    try:
+        path = settings.SPELLING_INDEX_PATH
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+
+        if mtime is not None and (spelling_index is None or mtime != spelling_index.built_at):
+            index = SpellingIndex()
+            try:
+                index.load(path)
+                spelling_index = index
+                logger.info(f"Loaded spelling index from {path}: {index.stats()}")
+                return
+            except (OSError, ValueError, pickle.UnpicklingError) as e:
+                logger.error(f"Could not load spelling index from {path}: {e}")
+
+        if mtime is None or spelling_index is None:
+            # No usable file (e.g. a fresh deployment); keep an in-memory build in step with the catalog
+            version = catalog_version()
+            if spelling_index is None or version != _catalog_version:
+                spelling_index = build_spelling_index()
+                _catalog_version = version
+                logger.info(f"Built spelling index from the catalog: {spelling_index.stats()}")
+    except Exception as e:
+        logger.error(f"Spelling index refresh failed: {e}")
+    finally:
+        connections.close_all()
+        _refresh_lock.release()
+
+
+def catalog_version():
+    """When the FoodItem catalog last changed, e.g. through import_fdc"""
+    from .models import FoodItem
+
+    return FoodItem.objects.aggregate(latest=Max('updated_at'))['latest']
+
+
+def correct_query(query):
+    """Return a spelling-corrected query, or None if there is nothing to correct or no index yet"""
+    try:
+        index = get_spelling_index()
+        return index.correct(query) if index is not None else None
+    except Exception as e:
+        logger.error(f"Spelling correction failed for {query!r}: {e}")
+        return None
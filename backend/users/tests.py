@@ -1,3 +1,465 @@
-from django.test import TestCase
+import asyncio
+import copy
+import datetime
+import io
+import itertools
+import json
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from .autocomplete import PrefixIndex
+from .cache import SingleFlight
+from .management.commands.import_fdc import iter_csv_foods, iter_json_array
+from .diary import create_food_entries, delete_food_entries, save_food_entry_edit, update_food_entries
+from .models import CustomUser, DailyNutritionSummary, FoodEntry
+from .spelling import MIN_VOCABULARY, SpellingIndex
+from .usda import extract_nutrients
+from .views import FOOD_ENTRY_FIELDS, parse_food_entry_changes, parse_food_entry_data
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Query plans are PostgreSQL specific')
+class FoodEntryDiaryIndexTests(TransactionTestCase):
+    """The diary query should be answered from foodentry_user_diary_idx alone"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='diary@smartbite.local', password='pw123456')
+        other = CustomUser.objects.create_user(email='other@smartbite.local', password='pw123456')
+        today = datetime.date(2026, 1, 31)
+        FoodEntry.objects.bulk_create(
+            FoodEntry(
+                user=owner,
+                food_name=f'Food {i}',
+                entry_date=today - datetime.timedelta(days=i % 30),
+                calories=i,
+            )
+            for owner in (self.user, other)
+            for i in range(300)
+        )
+        self.date = today
+        with connection.cursor() as cursor:
+            # Sets the visibility map, which index-only scans need, and refreshes statistics.
+            # VACUUM cannot run in a transaction, hence TransactionTestCase.
+            cursor.execute('VACUUM ANALYZE users_foodentry')
+
+    def explain(self, queryset):
+        with connection.cursor() as cursor:
+            # A table this small would be read sequentially; only ask whether the index can serve
+            # the query without a sort
+            cursor.execute('SET enable_seqscan = off')
+            cursor.execute('SET enable_bitmapscan = off')
+            try:
+                return queryset.explain()
+            finally:
+                cursor.execute('RESET enable_seqscan')
+                cursor.execute('RESET enable_bitmapscan')
+
+    def assert_diary_index_only_scan(self, queryset):
+        plan = self.explain(queryset)
+        self.assertIn('Index Only Scan using foodentry_user_diary_idx', plan)
+        self.assertNotIn('Sort', plan)
+
+    def test_entries_for_a_date(self):
+        self.assert_diary_index_only_scan(
+            FoodEntry.objects.filter(user=self.user, entry_date=self.date)
+            .order_by('-entry_date', '-created_at', '-id')
+            .values(*FOOD_ENTRY_FIELDS, 'created_at')[:101]
+        )
+
+    def test_all_entries(self):
+        self.assert_diary_index_only_scan(
+            FoodEntry.objects.filter(user=self.user)
+            .order_by('-entry_date', '-created_at', '-id')
+            .values(*FOOD_ENTRY_FIELDS, 'created_at')[:101]
+        )
+
+
+class SpellingIndexTests(SimpleTestCase):
+    """SymSpell corrections against the catalog vocabulary"""
+
+    NAMES = [
+        'Chicken breast, grilled',
+        'Chicken thigh, roasted',
+        'Bananas, raw',
+        'Rice, white, cooked',
+        'Rice, brown, cooked',
+        'Rice noodles',
+        'Ride cymbal',
+    ]
+
+    def setUp(self):
+        # Filler words made of letters no test word uses, to get past MIN_VOCABULARY
+        filler = [''.join(letters) for letters in itertools.product('qxzj', repeat=5)]
+        self.assertGreaterEqual(len(filler), MIN_VOCABULARY)
+        self.index = SpellingIndex()
+        self.index.build(self.NAMES + filler)
+
+    def test_known_words_are_kept(self):
+        self.assertEqual(self.index.lookup('chicken'), 'chicken')
+        self.assertIsNone(self.index.correct('grilled chicken breast'))
+
+    def test_corrects_misspelled_words(self):
+        self.assertEqual(self.index.lookup('chiken'), 'chicken')
+        self.assertEqual(self.index.lookup('brest'), 'breast')
+        self.assertEqual(self.index.lookup('bananans'), 'bananas')
+        self.assertEqual(self.index.correct('grilled chiken brest'), 'grilled chicken breast')
+
+    def test_transposition_is_one_edit(self):
+        self.assertEqual(self.index.lookup('chikcen'), 'chicken')
+        self.assertEqual(self.index.lookup('rcie'), 'rice')
+
+    def test_short_words_allow_one_edit(self):
+        self.assertEqual(self.index.lookup('rce'), 'rice')
+        self.assertIsNone(self.index.lookup('rxcx'))
+
+    def test_prefers_the_more_common_word(self):
+        # 'rize' is one edit from both; 'rice' is in three names, 'ride' in one
+        self.assertEqual(self.index.lookup('rize'), 'rice')
+
+    def test_leaves_short_and_numeric_words_alone(self):
+        self.assertIsNone(self.index.correct('ri 100g'))
+        self.assertEqual(self.index.correct('chiken 100g'), 'chicken 100g')
+
+    def test_no_corrections_below_min_vocabulary(self):
+        index = SpellingIndex()
+        index.build(self.NAMES)
+        self.assertEqual(index.lookup('chiken'), 'chicken')
+        self.assertIsNone(index.correct('grilled chiken'))
+
+
+class PrefixIndexTests(SimpleTestCase):
+    """Autocomplete ranking and incremental updates between rebuilds"""
+
+    def setUp(self):
+        self.index = PrefixIndex()
+        self.index.build(
+            [
+                ('1', 'Chicken breast, grilled'),
+                ('2', 'Chicken'),
+                ('3', 'Chickpeas, canned'),
+                ('4', 'Rice, white, cooked'),
+                ('5', 'Fried chicken'),
+            ],
+            {'3': 5, '4': 1, '99': 10},
+        )
+
+    def complete_ids(self, prefix, limit=10):
+        return [fdc_id for fdc_id, _ in self.index.complete(prefix, limit=limit)]
+
+    def test_ranks_by_popularity_then_name_length(self):
+        # Short prefixes use the precomputed lists, longer ones scan the keys
+        self.assertEqual(self.complete_ids('chi'), ['3', '2', '5', '1'])
+        self.assertEqual(self.complete_ids('chick'), ['3', '2', '5', '1'])
+        self.assertEqual(self.complete_ids('chicken'), ['2', '5', '1'])
+        self.assertEqual(self.complete_ids('chi', limit=2), ['3', '2'])
+
+    def test_matches_later_words(self):
+        self.assertEqual(self.complete_ids('breast'), ['1'])
+        self.assertEqual(self.complete_ids('Cooked'), ['4'])
+        self.assertEqual(self.complete_ids('xyz'), [])
+        self.assertEqual(self.complete_ids(''), [])
+
+    def test_upsert_adds_a_food(self):
+        self.index.upsert('6', 'Chia seeds')
+        self.assertEqual(self.complete_ids('chi'), ['3', '2', '6', '5', '1'])
+        self.assertEqual(self.complete_ids('seed'), ['6'])
+        self.assertEqual(self.index.stats()['foods'], 6)
+
+    def test_upsert_renames_a_food(self):
+        self.index.upsert('3', 'Lentils, canned')
+        self.assertEqual(self.complete_ids('chi'), ['2', '5', '1'])
+        self.assertEqual(self.complete_ids('chickp'), [])
+        self.assertEqual(self.complete_ids('len'), ['3'])
+        self.assertEqual(self.complete_ids('lentil'), ['3'])
+        self.assertEqual(self.complete_ids('canned'), ['3'])
+
+    def test_remove(self):
+        keys = self.index.stats()['keys']
+        self.index.remove('2')
+        self.index.remove('unknown')
+        self.assertEqual(self.complete_ids('chi'), ['3', '5', '1'])
+        self.assertEqual(self.complete_ids('chicken'), ['5', '1'])
+        self.assertEqual(self.index.stats()['keys'], keys - 1)
+
+    def test_bump_promotes(self):
+        self.index.bump('1', 10)
+        self.assertEqual(self.complete_ids('chi'), ['1', '3', '2', '5'])
+        self.assertEqual(self.complete_ids('breast'), ['1'])
+        self.assertEqual(self.complete_ids('chicken'), ['1', '2', '5'])
+
+    @mock.patch('users.autocomplete.BLOCK_SIZE', 2)
+    def test_updates_across_blocks(self):
+        index = PrefixIndex()
+        index.build([(str(i), f'Food {i:03d}') for i in range(0, 40, 2)], {})
+        for i in range(1, 40, 2):
+            index.upsert(str(i), f'Food {i:03d}')
+        for i in range(0, 40, 3):
+            index.remove(str(i))
+        self.assertEqual(
+            sorted((fdc_id for fdc_id, _ in index.complete('food 01', limit=50)), key=int),
+            ['10', '11', '13', '14', '16', '17', '19'],
+        )
+        self.assertEqual(
+            sorted((fdc_id for fdc_id, _ in index.complete('food', limit=50)), key=int),
+            [str(i) for i in range(40) if i % 3],
+        )
+        self.assertEqual(index.stats()['keys'], 2 * 26)
+
+
+class FDCImportParsingTests(SimpleTestCase):
+    """Streaming the JSON and CSV FoodData Central downloads"""
+
+    FOODS = [
+        {'fdcId': 1, 'description': 'Bananas, raw', 'foodNutrients': [{'number': '208', 'amount': 89}]},
+        {'fdcId': 2, 'description': 'Rice [white], "cooked"', 'foodNutrients': []},
+        {'fdcId': 3, 'description': 'Braces } and commas, inside strings', 'foodNutrients': []},
+    ]
+
+    def test_json_items_split_across_reads(self):
+        text = json.dumps({'FoundationFoods': self.FOODS}, indent=2)
+        for chunk_size in (1, 2, 7, 64, len(text)):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(list(iter_json_array(io.StringIO(text), chunk_size)), self.FOODS)
+
+    def test_json_empty_list(self):
+        self.assertEqual(list(iter_json_array(io.StringIO('{"SRLegacyFoods": [ ]}'), 3)), [])
+
+    def test_json_truncated_download(self):
+        text = json.dumps({'FoundationFoods': self.FOODS})[:-40]
+        with self.assertRaises(CommandError):
+            list(iter_json_array(io.StringIO(text), 16))
+
+    def test_csv_join_skips_unselected_foods(self):
+        files = {
+            'food.csv': (
+                'fdc_id,data_type,description\n'
+                '1,foundation_food,"Bananas, raw"\n'
+                '2,sub_sample_food,Bananas sample\n'
+                '3,sr_legacy_food,Rice\n'
+            ),
+            'food_nutrient.csv': (
+                'id,fdc_id,nutrient_id,amount\n'
+                '10,1,2047,90\n'
+                '11,1,1008,89\n'
+                '12,1,1003,1.1\n'
+                '13,2,1003,5\n'
+                '14,3,2048,130\n'
+                '15,3,1005,28.2\n'
+            ),
+        }
+        opened = []
+
+        def open_file(name):
+            opened.append(name)
+            return io.StringIO(files[name])
+
+        rows = list(iter_csv_foods(open_file, {'Foundation'}))
+        self.assertEqual(opened, ['food.csv', 'food_nutrient.csv', 'food.csv'])
+        self.assertEqual(rows, [{
+            'fdc_id': '1',
+            'name': 'Bananas, raw',
+            'data_type': 'Foundation',
+            'calories_per_100g': 89.0,
+            'protein_per_100g': 1.1,
+            'fat_per_100g': 0.0,
+            'carbs_per_100g': 0.0,
+        }])
+        self.assertEqual(
+            [(row['fdc_id'], row['calories_per_100g']) for row in iter_csv_foods(open_file, set())],
+            [('1', 89.0), ('3', 130.0)],
+        )
+
+
+class ExtractNutrientsTests(SimpleTestCase):
+    """Reading USDA_NUTRIENTS from full and abridged foodNutrients lists"""
+
+    def test_full_format_uses_nutrient_ids(self):
+        food_nutrients = [
+            {'nutrient': {'id': 1008, 'number': '208'}, 'amount': 89},
+            {'nutrient': {'id': 1003, 'number': '203'}, 'amount': 1.1},
+            {'nutrient': {'id': 1004, 'number': '204'}, 'amount': 0.3},
+            {'nutrient': {'id': 1005, 'number': '205'}, 'amount': 22.8},
+            {'nutrient': {'id': 1079, 'number': '291'}, 'amount': 2.6},
+        ]
+        self.assertEqual(
+            extract_nutrients(food_nutrients),
+            {'calories': 89, 'protein': 1.1, 'fat': 0.3, 'carbs': 22.8},
+        )
+
+    def test_abridged_format_uses_nutrient_numbers(self):
+        food_nutrients = [
+            {'number': '208', 'amount': 89},
+            {'number': 203, 'amount': 1.1},
+            {'number': '291', 'amount': 2.6},
+        ]
+        self.assertEqual(extract_nutrients(food_nutrients), {'calories': 89, 'protein': 1.1})
+
+    def test_full_format_ignores_numbers(self):
+        # A full entry is identified by its nutrient id, even if its number would match
+        food_nutrients = [{'nutrient': {'id': 1079, 'number': '208'}, 'amount': 2.6}]
+        self.assertEqual(extract_nutrients(food_nutrients), {})
+
+    def test_energy_priority(self):
+        kcal = {'number': '208', 'amount': 89}
+        general = {'number': '957', 'amount': 90}
+        specific = {'number': '958', 'amount': 91}
+        for food_nutrients, expected in (
+            ([specific, general, kcal], 89),
+            ([kcal, specific, general], 89),
+            ([specific, general], 90),
+            ([general, specific], 90),
+            ([specific], 91),
+        ):
+            with self.subTest(food_nutrients=food_nutrients):
+                self.assertEqual(extract_nutrients(food_nutrients), {'calories': expected})
+
+    def test_missing_amounts_are_skipped(self):
+        food_nutrients = [
+            {'nutrient': {'id': 1008}, 'amount': None},
+            {'nutrient': {'id': 2047}, 'amount': 90},
+            {'nutrient': {'id': 1003}},
+        ]
+        self.assertEqual(extract_nutrients(food_nutrients), {'calories': 90})
+
+
+class SingleFlightTests(SimpleTestCase):
+    """Coalescing concurrent async calls"""
+
+    def test_cancelled_leader_does_not_cancel_waiters(self):
+        flight = SingleFlight('test')
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'result'
+
+        async def scenario():
+            leader = asyncio.create_task(flight.ado('key', fetch))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(flight.ado('key', fetch))
+            await asyncio.sleep(0)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await waiter
+
+        self.assertEqual(asyncio.run(scenario()), 'result')
+        self.assertEqual(len(calls), 1)
+        stats = flight.stats()
+        self.assertEqual((stats['coalesced'], stats['in_flight']), (1, 0))
+
+    def test_waiters_share_the_error(self):
+        flight = SingleFlight('test')
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ValueError('upstream failed')
+
+        async def scenario():
+            return await asyncio.gather(
+                *(flight.ado('key', fetch) for _ in range(3)),
+                return_exceptions=True
+            )
+
+        results = asyncio.run(scenario())
+        self.assertEqual([type(result) for result in results], [ValueError] * 3)
+        self.assertEqual(flight.stats()['errors'], 1)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Entry totals are PostgreSQL generated columns')
+class NutritionSummaryDeltaTests(TestCase):
+    """record_changes should keep the summaries equal to a rebuild from the entries"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='summary@smartbite.local', password='pw123456')
+        self.date = datetime.date(2026, 3, 1)
+
+    def entry(self, **fields):
+        return FoodEntry(**{
+            'food_name': 'Rice',
+            'meal_type': 'Lunch',
+            'calories': 130,
+            'protein': 2.7,
+            'fat': 0.3,
+            'carbs': 28,
+            'entry_date': self.date,
+            **fields,
+        })
+
+    def summaries(self):
+        return {
+            (summary.date, summary.meal_type): (
+                summary.entry_count, summary.calories, summary.protein, summary.fat, summary.carbs
+            )
+            for summary in DailyNutritionSummary.objects.filter(user=self.user)
+        }
+
+    def assert_summaries(self, expected):
+        """Compare the summaries with expected {(date, meal): (count, calories)} and a rebuild"""
+        recorded = self.summaries()
+        self.assertEqual(set(recorded), set(expected))
+        for key, (count, calories) in expected.items():
+            self.assertEqual(recorded[key][0], count)
+            self.assertAlmostEqual(recorded[key][1], calories)
+        DailyNutritionSummary.rebuild([self.user.id])
+        rebuilt = self.summaries()
+        self.assertEqual(set(rebuilt), set(recorded))
+        for key, values in recorded.items():
+            for value, rebuilt_value in zip(values, rebuilt[key]):
+                self.assertAlmostEqual(value, rebuilt_value)
+
+    def test_create(self):
+        create_food_entries(self.user, [
+            self.entry(),
+            self.entry(serving_size=1, serving_size_unit='cup', number_of_servings=2),
+            self.entry(meal_type='Dinner', serving_size=50),
+        ])
+        self.assert_summaries({
+            (self.date, 'Lunch'): (2, 130 + 130 * 1.28 * 2),
+            (self.date, 'Dinner'): (1, 65),
+        })
+
+    def test_edit_moves_totals_between_rows(self):
+        food_entry, other = create_food_entries(self.user, [self.entry(), self.entry()])
+        food_entry = FoodEntry.objects.select_for_update().get(pk=food_entry.pk)
+        previous = copy.copy(food_entry)
+        food_entry.meal_type = 'Snack'
+        food_entry.entry_date = self.date + datetime.timedelta(days=1)
+        food_entry.number_of_servings = 3
+        save_food_entry_edit(food_entry, previous)
+        self.assert_summaries({
+            (self.date, 'Lunch'): (1, 130),
+            (self.date + datetime.timedelta(days=1), 'Snack'): (1, 390),
+        })
+
+    def test_bulk_update(self):
+        entries = create_food_entries(self.user, [self.entry(), self.entry(), self.entry(meal_type='Dinner')])
+        update_food_entries(self.user, {
+            entries[0].id: {'serving_size': 200},
+            entries[2].id: {'meal_type': 'Lunch', 'serving_size_unit': 'oz', 'serving_size': 2},
+        })
+        self.assert_summaries({(self.date, 'Lunch'): (3, 260 + 130 + 130 * 0.566990)})
+
+    def test_delete_drops_empty_rows(self):
+        entries = create_food_entries(self.user, [self.entry(), self.entry(meal_type='Dinner')])
+        self.assertEqual(delete_food_entries(self.user, [entries[1].id]), {entries[1].id})
+        self.assert_summaries({(self.date, 'Lunch'): (1, 130)})
+        delete_food_entries(self.user, [entries[0].id])
+        self.assert_summaries({})
+
+
+class FoodEntryParsingTests(SimpleTestCase):
+    """Validation of food entry request fields"""
+
+    def test_rejects_non_finite_and_negative_amounts(self):
+        for value in ('NaN', 'nan', 'Infinity', '-inf', float('nan'), -1):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    parse_food_entry_data({'fdc_id': '1', 'serving_size': value})
+                with self.assertRaises(ValueError):
+                    parse_food_entry_changes({'number_of_servings': value})
+        self.assertEqual(parse_food_entry_changes({'serving_size': '0'}), {'serving_size': 0.0})
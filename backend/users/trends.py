@@ -0,0 +1,106 @@
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+
+from .models import DailyNutritionSummary, FoodEntry
+
+# Buckets from finest to coarsest, with their approximate length in days
+TREND_BUCKETS = {'day': 1, 'week': 7, 'month': 30.44}
+# Buckets averaged by the rolling average when the request does not say
+DEFAULT_TREND_WINDOWS = {'day': 7, 'week': 4, 'month': 3}
+MAX_TREND_WINDOW = 52
+
+# Postgres only: RANGE frames with an interval offset have no ORM equivalent. The frame spans
+# calendar time, so buckets with nothing logged shorten the average instead of counting as zero.
+TRENDS_SQL = '''
+WITH buckets AS (
+    SELECT date_trunc(%(bucket)s, date)::date AS bucket,
+           COUNT(DISTINCT date) AS days_logged,
+           SUM(entry_count) AS entry_count,
+           {bucket_sums}
+    FROM {table}
+    WHERE user_id = %(user_id)s AND date BETWEEN %(since)s AND %(end)s
+    GROUP BY 1
+), windowed AS (
+    SELECT *,
+           SUM(days_logged) OVER w AS window_days,
+           {window_sums}
+    FROM buckets
+    WINDOW w AS (ORDER BY bucket RANGE BETWEEN %(window_span)s::interval PRECEDING AND CURRENT ROW)
+)
+SELECT bucket, days_logged, entry_count,
+       {columns},
+       {rolling_averages}
+FROM windowed
+WHERE bucket >= %(start)s
+ORDER BY bucket
+'''.format(
+    table=DailyNutritionSummary._meta.db_table,
+    bucket_sums=', '.join(f'SUM({n}) AS {n}' for n in FoodEntry.NUTRIENT_FIELDS),
+    window_sums=', '.join(f'SUM({n}) OVER w AS window_{n}' for n in FoodEntry.NUTRIENT_FIELDS),
+    columns=', '.join(FoodEntry.NUTRIENT_FIELDS),
+    rolling_averages=', '.join(f'window_{n} / window_days AS rolling_{n}' for n in FoodEntry.NUTRIENT_FIELDS),
+)
+
+
+def choose_trend_bucket(start, end, bucket='day'):
+    """Return bucket, or the finest coarser one giving at most FOOD_TRENDS_MAX_POINTS points"""
+    days = (end - start).days + 1
+    names = list(TREND_BUCKETS)
+    for name in names[names.index(bucket):]:
+        if math.ceil(days / TREND_BUCKETS[name]) + 1 <= settings.FOOD_TRENDS_MAX_POINTS:
+            return name
+    return names[-1]
+
+
+def bucket_start(day, bucket):
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def window_since(start, bucket, window):
+    """First day the rolling average of the bucket containing start reaches back to"""
+    start = bucket_start(start, bucket)
+    if bucket == 'month':
+        month = start.year * 12 + start.month - 1 - (window - 1)
+        return start.replace(year=month // 12, month=month % 12 + 1)
+    return start - timedelta(days=TREND_BUCKETS[bucket] * (window - 1))
+
+
+def nutrition_trends(user_id, start, end, bucket, window):
+    """Per-bucket nutrient totals and rolling daily averages from DailyNutritionSummary.
+
+    Buckets are calendar days, ISO weeks or months, the first one containing start. Only
+    buckets with something logged are returned. The rolling average is the mean daily intake
+    over the days logged in the bucket and the window - 1 buckets before it.
+    """
+    params = {
+        'user_id': user_id,
+        'bucket': bucket,
+        'start': bucket_start(start, bucket),
+        'since': window_since(start, bucket, window),
+        'end': end,
+        'window_span': f'{window - 1} {bucket}s',
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(TRENDS_SQL, params)
+        rows = cursor.fetchall()
+
+    nutrients = FoodEntry.NUTRIENT_FIELDS
+    points = []
+    for bucket_date, days_logged, entry_count, *values in rows:
+        totals, rolling = values[:len(nutrients)], values[len(nutrients):]
+        points.append({
+            'date': bucket_date.isoformat(),
+            'days_logged': days_logged,
+            'entry_count': entry_count,
+            'totals': dict(zip(nutrients, totals)),
+            'daily_average': {n: total / days_logged for n, total in zip(nutrients, totals)},
+            'rolling_average': dict(zip(nutrients, rolling)),
+        })
+    return points
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     # Authentication URLs
@@ -10,11 +10,30 @@ urlpatterns = [
     
     # Food Entry API endpoints
     path('food-entries/', views.get_food_entries, name='get-food-entries'),
+    path('food-entries/range/', views.get_food_entries_range, name='get-food-entries-range'),
+    path('food-entries/summary/', views.get_nutrition_summary, name='nutrition-summary'),
+    path('food-entries/summary/range/', views.get_nutrition_summary_range, name='nutrition-summary-range'),
+    path('food-entries/trends/', views.get_nutrition_trends, name='nutrition-trends'),
     path('food-entries/create/', views.create_food_entry, name='create-food-entry'),
+    path('food-entries/bulk/', views.create_food_entries_bulk, name='create-food-entries-bulk'),
+    path('food-entries/bulk/update/', views.update_food_entries_bulk, name='update-food-entries-bulk'),
+    path('food-entries/bulk/delete/', views.delete_food_entries_bulk, name='delete-food-entries-bulk'),
+    path('food-entries/changes/', views.get_food_entry_changes, name='food-entry-changes'),
+    path('food-entries/push/', views.push_food_entry_changes, name='push-food-entry-changes'),
     path('food-entries/<int:entry_id>/update/', views.update_food_entry, name='update-food-entry'),
     path('food-entries/<int:entry_id>/delete/', views.delete_food_entry, name='delete-food-entry'),
     
     # USDA Food Search
     path('foods/search/', views.search_foods, name='search-foods'),
+    path('foods/search/local/', views.search_food_items, name='search-food-items'),
+    path('foods/autocomplete/', views.autocomplete_foods, name='autocomplete-foods'),
+    path('foods/autocomplete/stats/', views.autocomplete_stats, name='autocomplete-stats'),
+    path('foods/details/batch/', views.get_food_details_batch_api, name='food-details-batch'),
     path('foods/details/<str:fdc_id>/', views.get_food_details_api, name='food-details'),
+    path('foods/usda/stats/', views.usda_stats, name='usda-stats'),
+
+    # Async USDA views, for deployments served through the ASGI entry point
+    path('foods/search/async/', async_views.search_foods_async, name='search-foods-async'),
+    path('foods/details/<str:fdc_id>/async/', async_views.get_food_details_async, name='food-details-async'),
+    path('food-entries/create/async/', async_views.create_food_entry_async, name='create-food-entry-async'),
 ]
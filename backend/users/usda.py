@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import os
+import threading
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Define available data types and their descriptions
+USDA_DATA_TYPES = {
+    'Foundation': 'Basic, non-branded foods with standardized nutrient values'
+}
+
+# Most fdcIds the USDA API accepts in a single POST /foods request
+USDA_FOODS_BATCH_SIZE = 20
+# Largest pageSize the USDA API accepts for /foods/search
+USDA_SEARCH_MAX_PAGE_SIZE = 200
+
+# FoodData Central nutrient IDs extracted from each food, mapped to (field, priority).
+# A field is taken from its lowest-priority ID present, since Foundation foods often
+# only report energy as the Atwater values. Add micronutrients here to extract them too.
+USDA_NUTRIENTS = {
+    1008: ('calories', 0),  # Energy (kcal)
+    2047: ('calories', 1),  # Energy (Atwater General Factors)
+    2048: ('calories', 2),  # Energy (Atwater Specific Factors)
+    1003: ('protein', 0),
+    1004: ('fat', 0),
+    1005: ('carbs', 0),  # Carbohydrate, by difference
+}
+# Legacy nutrient numbers, which abridged responses and the nutrients= filter use instead of IDs
+USDA_NUTRIENT_NUMBERS = {
+    '208': 1008,
+    '957': 2047,
+    '958': 2048,
+    '203': 1003,
+    '204': 1004,
+    '205': 1005,
+}
+USDA_NUTRIENT_FIELDS = tuple(dict.fromkeys(field for field, _ in USDA_NUTRIENTS.values()))
+
+# Ask only for the extracted nutrients (the API allows up to 25), without the full
+# format's portions, footnotes and per-nutrient metadata
+USDA_FOOD_PARAMS = {
+    'format': 'abridged',
+    'nutrients': [int(number) for number in USDA_NUTRIENT_NUMBERS],
+}
+
+
+def extract_nutrients(food_nutrients):
+    """Pick the USDA_NUTRIENTS out of a full or abridged foodNutrients list"""
+    values = {}
+    priorities = {}
+    for nutrient in food_nutrients:
+        detail = nutrient.get('nutrient')
+        if detail is not None:
+            nutrient_id = detail.get('id')
+        else:
+            # Abridged entries carry the number, as a string or an integer
+            nutrient_id = USDA_NUTRIENT_NUMBERS.get(str(nutrient.get('number')))
+        entry = USDA_NUTRIENTS.get(nutrient_id)
+        amount = nutrient.get('amount')
+        if entry is None or amount is None:
+            continue
+        field, priority = entry
+        if field not in priorities or priority < priorities[field]:
+            priorities[field] = priority
+            values[field] = amount
+    return values
+
+
+class USDAClient:
+    """Keep-alive HTTP client for the USDA FoodData Central API"""
+
+    def __init__(self, base_url, api_key, pool_size=10, connect_timeout=3.05, read_timeout=10.0):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+
+        # A single host is involved, so one pool of up to pool_size connections is enough
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.session.headers.update({
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+        })
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._errors = 0
+
+    def request(self, method, path, params=None, **kwargs):
+        """Send a request to the USDA API and raise for HTTP errors"""
+        params = {'api_key': self.api_key, **(params or {})}
+        with self._lock:
+            self._requests += 1
+        try:
+            response = self.session.request(
+                method,
+                f"{self.base_url}{path}",
+                params=params,
+                timeout=self.timeout,
+                **kwargs
+            )
+            response.raise_for_status()
+            return response
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self._errors += 1
+            raise
+
+    def get(self, path, params=None):
+        return self.request('GET', path, params=params)
+
+    def post(self, path, json=None, params=None):
+        return self.request('POST', path, params=params, json=json)
+
+    def pool_stats(self):
+        """Report connection pool usage for sizing against the worker count"""
+        pools = []
+        pool_manager = self.adapter.poolmanager
+        for key in pool_manager.pools.keys():
+            pool = pool_manager.pools.get(key)
+            if pool is None:
+                continue
+            # Free slots in the queue are either idle connections or None placeholders
+            queued = list(pool.pool.queue) if pool.pool is not None else []
+            pools.append({
+                'host': pool.host,
+                'port': pool.port,
+                'max_size': self.pool_size,
+                'in_use': self.pool_size - len(queued),
+                'idle': sum(1 for conn in queued if conn is not None),
+                'connections_opened': pool.num_connections,
+                'requests_sent': pool.num_requests,
+            })
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'pool_size': self.pool_size,
+                'connect_timeout': self.timeout[0],
+                'read_timeout': self.timeout[1],
+                'requests': self._requests,
+                'errors': self._errors,
+                'pools': pools,
+            }
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncUSDAClient:
+    """Keep-alive asyncio HTTP client for the USDA API, one per event loop"""
+
+    def __init__(self, base_url, api_key, pool_size=32, connect_timeout=3.05, read_timeout=10.0):
+        self.api_key = api_key
+        self.pool_size = pool_size
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip('/'),
+            headers={'Accept': 'application/json', 'Accept-Encoding': 'gzip, deflate'},
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        )
+        # httpcore rescans every queued request against every connection whenever one is
+        # released, so callers beyond the pool size wait here instead of in its queue
+        self._slots = asyncio.Semaphore(pool_size)
+        self._requests = 0
+        self._errors = 0
+
+    async def request(self, method, path, params=None, **kwargs):
+        """Send a request to the USDA API and raise for HTTP errors"""
+        params = {'api_key': self.api_key, **(params or {})}
+        self._requests += 1
+        try:
+            async with self._slots:
+                response = await self.client.request(method, path, params=params, **kwargs)
+                await response.aread()
+            response.raise_for_status()
+            return response
+        except httpx.HTTPError:
+            self._errors += 1
+            raise
+
+    async def get(self, path, params=None):
+        return await self.request('GET', path, params=params)
+
+    async def post(self, path, json=None, params=None):
+        return await self.request('POST', path, params=params, json=json)
+
+    def pool_stats(self):
+        return {
+            'pool_size': self.pool_size,
+            'waiting': len(self._slots._waiters or ()),
+            'requests': self._requests,
+            'errors': self._errors,
+        }
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+# httpx connections belong to the loop that opened them, so async clients are per loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_usda_client():
+    """Return this process's shared USDA client, creating it on first use"""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            # Connections must not be shared with a forked parent, so rebuild per pid
+            if _client is None or _client_pid != pid:
+                _client = USDAClient(
+                    base_url=settings.USDA_API_BASE_URL,
+                    api_key=settings.USDA_API_KEY,
+                    pool_size=settings.USDA_HTTP_POOL_SIZE,
+                    connect_timeout=settings.USDA_HTTP_CONNECT_TIMEOUT,
+                    read_timeout=settings.USDA_HTTP_READ_TIMEOUT,
+                )
+                _client_pid = pid
+    return _client
+
+
+def get_async_usda_client():
+    """Return the shared async USDA client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncUSDAClient(
+            base_url=settings.USDA_API_BASE_URL,
+            api_key=settings.USDA_API_KEY,
+            pool_size=settings.USDA_ASYNC_POOL_SIZE,
+            connect_timeout=settings.USDA_HTTP_CONNECT_TIMEOUT,
+            read_timeout=settings.USDA_HTTP_READ_TIMEOUT,
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def reset_usda_clients():
+    """Drop the shared clients so the next call picks up current settings"""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        _client_pid = None
+    _async_clients.clear()
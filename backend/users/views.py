@@ -1,7 +1,13 @@
+import copy
+import hashlib
+import heapq
+import itertools
 import logging
 import random
+from django.core import signing
 from django.core.mail import send_mail
 from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
 from django.contrib.auth import get_user_model, authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
@@ -9,14 +15,45 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework import status
 from django.utils import timezone
-from datetime import datetime
+from datetime import datetime, timedelta
 from django.shortcuts import get_object_or_404
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+import math
 import requests
 import os
 from django.conf import settings
 
-from .models import CustomUser, FoodEntry, FoodItem
-from rest_framework.permissions import IsAuthenticated
+from .models import (
+    CustomUser,
+    DailyNutritionSummary,
+    FoodDiaryVersion,
+    FoodEntry,
+    FoodEntryTombstone,
+    FoodItem,
+)
+from .autocomplete import get_food_index
+from .cache import MISSING, BackgroundRefresher, SharedCallFailed, SingleFlight, TieredCache
+from .diary import create_food_entries, delete_food_entries, save_food_entry_edit, update_food_entries
+from .search import search_local_foods
+from .spelling import correct_query
+from .trends import (
+    DEFAULT_TREND_WINDOWS,
+    MAX_TREND_WINDOW,
+    TREND_BUCKETS,
+    choose_trend_bucket,
+    nutrition_trends,
+)
+from .usda import (
+    USDA_DATA_TYPES,
+    USDA_SEARCH_MAX_PAGE_SIZE,
+    USDA_FOOD_PARAMS,
+    USDA_FOODS_BATCH_SIZE,
+    USDA_NUTRIENT_FIELDS,
+    extract_nutrients,
+    get_usda_client,
+)
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.authtoken.models import Token
 
 logger = logging.getLogger(__name__)
@@ -204,7 +241,6 @@ def log_food_entry(request):
 
 # USDA API configuration
 USDA_API_KEY = os.getenv('USDA_API_KEY')  # Get API key from environment variable
-USDA_API_BASE_URL = 'https://api.nal.usda.gov/fdc/v1'
 
 # Log API key status
 if not USDA_API_KEY:
@@ -212,111 +248,322 @@ if not USDA_API_KEY:
 else:
     logging.info("Using USDA API key for food search")
 
+# Concurrent lookups of the same food share one USDA request; the lock covers a full fetch
+details_flight = SingleFlight(
+    'usda-food-details',
+    cache_alias='default',
+    lock_timeout=math.ceil(settings.USDA_HTTP_CONNECT_TIMEOUT + settings.USDA_HTTP_READ_TIMEOUT),
+)
+
+# Expired foods are refetched off the request path, a few at a time
+details_refresher = BackgroundRefresher('usda-food-details', max_workers=settings.USDA_REFRESH_WORKERS)
+
+def stored_food_details(fdc_id):
+    """Return food details from the local FoodItem store, or MISSING if absent or stale"""
+    food_item = FoodItem.objects.filter(fdc_id=fdc_id).defer('usda_payload').first()
+    if food_item and food_item.is_fresh():
+        return food_item.to_food_details()
+    return MISSING
+
 def get_food_details(fdc_id):
-    """Fetch food details from USDA API"""
-    url = f"{USDA_API_BASE_URL}/food/{str(fdc_id)}"  # Ensure fdc_id is a string
-    params = {'api_key': USDA_API_KEY}
-    
+    """Fetch food details, reading through the local FoodItem store before the USDA API"""
+    fdc_id = str(fdc_id)  # Ensure fdc_id is a string
+    food_item = FoodItem.objects.filter(fdc_id=fdc_id).defer('usda_payload').first()
+    if food_item and food_item.is_fresh():
+        return food_item.to_food_details()
+
+    # Serve expired details right away, so a slow or failing USDA API does not block logging
+    if food_item and food_item.is_servable():
+        details_refresher.submit(fdc_id, lambda: fetch_food_details(fdc_id))
+        return food_item.to_food_details()
+
+    return fetch_food_details(fdc_id)
+
+def fetch_food_details(fdc_id):
+    """Fetch and store food details, sharing the USDA request with concurrent lookups"""
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        nutrients = {
-            'calories': 0,
-            'protein': 0,
-            'fat': 0,
-            'carbs': 0
-        }
-        
-        # Extract nutrients from the response
-        for nutrient in data.get('foodNutrients', []):
-            if nutrient.get('nutrient', {}).get('name') == 'Energy':
-                nutrients['calories'] = nutrient.get('amount', 0)
-            elif nutrient.get('nutrient', {}).get('name') == 'Protein':
-                nutrients['protein'] = nutrient.get('amount', 0)
-            elif nutrient.get('nutrient', {}).get('name') == 'Total lipid (fat)':
-                nutrients['fat'] = nutrient.get('amount', 0)
-            elif nutrient.get('nutrient', {}).get('name') == 'Carbohydrate, by difference':
-                nutrients['carbs'] = nutrient.get('amount', 0)
-        
-        return {
-            'name': data.get('description', ''),
-            'nutrients': nutrients
-        }
+        return details_flight.do(
+            fdc_id,
+            lambda: fetch_and_store_food_details(fdc_id),
+            lookup=lambda: stored_food_details(fdc_id)
+        )
+    except SharedCallFailed as e:
+        logging.error(f"Error fetching food details: {e}")
+        return None
+
+def fetch_and_store_food_details(fdc_id):
+    """Fetch food details from USDA API and keep them in the FoodItem store"""
+    data = fetch_usda_food(fdc_id)
+    if data is None:
+        return None
+
+    food_details = parse_food_details(data)
+    try:
+        FoodItem.store_usda_food(fdc_id, food_details, data)
+    except DatabaseError as e:
+        logging.error(f"Error storing food details for {fdc_id}: {e}")
+    return food_details
+
+def fetch_usda_food(fdc_id):
+    """Fetch the raw food record from USDA API"""
+    try:
+        response = get_usda_client().get(f"/food/{fdc_id}", params=USDA_FOOD_PARAMS)
+        return response.json()
     except requests.exceptions.RequestException as e:
         logging.error(f"Error fetching food details: {e}")
         return None
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def search_foods(request):
-    """Search foods using USDA API"""
-    query = request.query_params.get('query', '')
-    data_type = request.query_params.get('data_type', '')  # New parameter for filtering by data type
-    
-    if not query:
-        return Response({'error': 'Query parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
-    
-    if not USDA_API_KEY:
-        return Response(
-            {'error': 'USDA API key not configured. Please set the USDA_API_KEY environment variable.'},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
-    
-    url = f"{USDA_API_BASE_URL}/foods/search"
-    
-    # Define available data types and their descriptions
-    available_data_types = {
-        'Foundation': 'Basic, non-branded foods with standardized nutrient values'
+def fetch_usda_foods(fdc_ids):
+    """Fetch raw food records from USDA API, in as few requests as the API allows"""
+    records = []
+    for start in range(0, len(fdc_ids), USDA_FOODS_BATCH_SIZE):
+        chunk = fdc_ids[start:start + USDA_FOODS_BATCH_SIZE]
+        try:
+            response = get_usda_client().post("/foods", json={'fdcIds': chunk, **USDA_FOOD_PARAMS})
+            records.extend(response.json())
+        except requests.exceptions.RequestException as e:
+            # The rest of the batch is still worth returning
+            logging.error(f"Error fetching food details for {chunk}: {e}")
+    return records
+
+def get_food_details_batch(fdc_ids):
+    """Fetch details for several foods, keyed by fdc_id; None for foods that could not be found"""
+    results = dict.fromkeys(str(fdc_id) for fdc_id in fdc_ids)
+    stale = []
+    for food_item in FoodItem.objects.filter(fdc_id__in=list(results)).defer('usda_payload'):
+        if food_item.is_fresh():
+            results[food_item.fdc_id] = food_item.to_food_details()
+        elif food_item.is_servable():
+            results[food_item.fdc_id] = food_item.to_food_details()
+            stale.append(food_item.fdc_id)
+
+    if stale:
+        details_refresher.submit(tuple(stale), lambda: fetch_and_store_food_details_batch(stale))
+
+    misses = [fdc_id for fdc_id, food_details in results.items() if food_details is None]
+    if misses:
+        results.update(fetch_and_store_food_details_batch(misses))
+    return results
+
+def fetch_and_store_food_details_batch(fdc_ids):
+    """Fetch details for several foods from USDA API and keep them in the FoodItem store"""
+    wanted = set(fdc_ids)
+    fetched = {}
+    payloads = []
+    for data in fetch_usda_foods(fdc_ids):
+        fdc_id = str(data.get('fdcId'))
+        if fdc_id in wanted:
+            fetched[fdc_id] = parse_food_details(data)
+            payloads.append((fdc_id, fetched[fdc_id], data))
+    if payloads:
+        try:
+            FoodItem.store_usda_foods(payloads)
+        except DatabaseError as e:
+            logging.error(f"Error storing food details for {len(payloads)} foods: {e}")
+    return fetched
+
+def parse_food_details(data):
+    """Extract the name and core nutrients from a USDA food record"""
+    nutrients = dict.fromkeys(USDA_NUTRIENT_FIELDS, 0)
+    nutrients.update(extract_nutrients(data.get('foodNutrients', [])))
+    return {
+        'name': data.get('description', ''),
+        'nutrients': nutrients
     }
-    
-    # Always use Foundation data type
-    data_types = ['Foundation']
-    
-    params = {
-        'api_key': USDA_API_KEY,
+
+# As for details_flight, the cross-process lock must outlast a slow USDA search
+search_cache = TieredCache(
+    prefix='foods-search',
+    maxsize=settings.USDA_SEARCH_LRU_SIZE,
+    ttl=settings.USDA_SEARCH_CACHE_TTL,
+    lock_timeout=math.ceil(settings.USDA_HTTP_CONNECT_TIMEOUT + settings.USDA_HTTP_READ_TIMEOUT),
+)
+
+def normalize_search_query(query):
+    """Case-fold a query and collapse its whitespace, so equivalent searches share cache entries"""
+    return ' '.join(query.casefold().split())
+
+def search_cache_key(query, data_types, page, page_size):
+    """Build a cache key that is identical for equivalent searches"""
+    raw_key = f"{normalize_search_query(query)}|{','.join(sorted(data_types))}|{page}|{page_size}"
+    return search_cache.make_key(raw_key)
+
+# Always use Foundation data type
+SEARCH_DATA_TYPES = ['Foundation']
+
+# Search pages are walked with an opaque, signed cursor naming the page after the one served
+SEARCH_CURSOR_SALT = 'users.search-cursor'
+DEFAULT_SEARCH_PAGE_SIZE = 50
+
+def search_cursor_query(query):
+    return hashlib.sha1(normalize_search_query(query).encode('utf-8')).hexdigest()[:16]
+
+def parse_search_page(params, query):
+    """Return (backend, page, page_size) from the cursor or page_size parameter.
+
+    backend is None for a first page. Raises ValueError for invalid parameters.
+    """
+    cursor = params.get('cursor')
+    if cursor:
+        try:
+            data = signing.loads(cursor, salt=SEARCH_CURSOR_SALT)
+        except signing.BadSignature:
+            raise ValueError('Invalid cursor')
+        if data.get('q') != search_cursor_query(query):
+            raise ValueError('Cursor does not belong to this query')
+        return data['b'], data['p'], data['s']
+
+    try:
+        page_size = int(params.get('page_size', DEFAULT_SEARCH_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('page_size must be an integer')
+    if not 1 <= page_size <= USDA_SEARCH_MAX_PAGE_SIZE:
+        raise ValueError(f'page_size must be between 1 and {USDA_SEARCH_MAX_PAGE_SIZE}')
+    return None, 1, page_size
+
+def next_search_cursor(query, backend, page, page_size, foods):
+    """Cursor for the page after this one, or None when this page was the last"""
+    if len(foods) < page_size:
+        return None
+    return signing.dumps(
+        {'q': search_cursor_query(query), 'b': backend, 'p': page + 1, 's': page_size},
+        salt=SEARCH_CURSOR_SALT,
+        compress=True
+    )
+
+def search_page_response(foods, cursor):
+    response = Response(foods)
+    if cursor:
+        response['X-Next-Cursor'] = cursor
+    return response
+
+# Next pages are fetched off the request path, so scrolling does not wait on USDA
+search_prefetcher = BackgroundRefresher('usda-search-prefetch', max_workers=settings.USDA_REFRESH_WORKERS)
+
+def prefetch_search_page(query, data_types, page, page_size):
+    """Warm the search cache with the page a client is likely to ask for next"""
+    key = search_cache_key(query, data_types, page, page_size)
+    if search_cache.get(key) is MISSING:
+        search_prefetcher.submit(
+            key,
+            lambda: search_cache.get_or_set(key, lambda: search_usda_foods(query, data_types, page, page_size))
+        )
+
+def usda_search_params(query, data_types, page=1, page_size=50):
+    """Build the query parameters for a USDA /foods/search request"""
+    return {
         'query': query,
         'dataType': data_types,
-        'pageSize': 50,
+        'pageSize': page_size,
+        'pageNumber': page,
         'sortBy': 'dataType.keyword',
         'sortOrder': 'asc',
         'requireAllWords': True
     }
+
+def format_search_results(query, data):
+    """Convert a USDA search response into our response shape"""
+    if not data.get('foods'):
+        logging.warning(f"No foods found for query: {query} (totalHits: {data.get('totalHits')})")
+        return []
+        
+    # Process foods
+    foods = []
+    for food in data.get('foods', []):
+        food_data = {
+            'fdc_id': str(food.get('fdcId')),
+            'name': food.get('description'),
+            'brand': food.get('brandOwner', ''),
+            'data_type': food.get('dataType', ''),
+            'data_type_description': USDA_DATA_TYPES.get(food.get('dataType', ''), ''),
+            'serving_size': food.get('servingSize', 100),
+            'serving_size_unit': food.get('servingSizeUnit', 'g')
+        }
+        foods.append(food_data)
     
+    logging.info(f"Found {len(foods)} foods for query: {query}")
+    return foods
+
+def search_usda_foods(query, data_types, page=1, page_size=50):
+    """Search foods using USDA API and return them in our response shape"""
+    params = usda_search_params(query, data_types, page, page_size)
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        if not data.get('foods'):
-            logging.warning(f"No foods found for query: {query}")
-            logging.warning(f"API Response: {data}")
-            return Response([])
-            
-        # Process foods
-        foods = []
-        for food in data.get('foods', []):
-            food_data = {
-                'fdc_id': str(food.get('fdcId')),
-                'name': food.get('description'),
-                'brand': food.get('brandOwner', ''),
-                'data_type': food.get('dataType', ''),
-                'data_type_description': available_data_types.get(food.get('dataType', ''), ''),
-                'serving_size': food.get('servingSize', 100),
-                'serving_size_unit': food.get('servingSizeUnit', 'g')
-            }
-            foods.append(food_data)
-        
-        # Remove alphabetical sorting
-        logging.info(f"Found {len(foods)} foods for query: {query}")
-        return Response(foods)
+        response = get_usda_client().get("/foods/search", params=params)
     except requests.exceptions.RequestException as e:
         logging.error(f"USDA API request failed: {str(e)}")
-        logging.error(f"Request URL: {url}")
         logging.error(f"Request params: {params}")
         if hasattr(e.response, 'text'):
             logging.error(f"API Error Response: {e.response.text}")
+        raise
+    return format_search_results(query, response.json())
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_foods(request):
+    """Search foods using USDA API, served from the search cache when possible.
+
+    Results are paged by page_size; the cursor for the next page is in the X-Next-Cursor header.
+    """
+    query = request.query_params.get('query', '')
+    data_type = request.query_params.get('data_type', '')  # New parameter for filtering by data type
+    
+    if not query.strip():
+        return Response({'error': 'Query parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        backend, page, page_size = parse_search_page(request.query_params, query)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Misspelled words would make requireAllWords match nothing, so search for the correction
+    corrected = correct_query(query)
+    response = search_food_page(corrected or query, backend, page, page_size, cursor_query=query)
+    if corrected:
+        response['X-Did-You-Mean'] = corrected
+    return response
+
+def search_local_page(query, backend, page, page_size, cursor_query):
+    """(foods, next cursor) from the local catalog, or None when USDA should serve the page.
+
+    The local catalog is searched first when it is the primary backend; USDA is the fallback
+    for first pages it has nothing for. A cursor keeps later pages on the backend of the first.
+    """
+    if backend == 'local' or (backend is None and settings.FOOD_SEARCH_BACKEND == 'local'):
+        try:
+            foods = search_local_foods(
+                query, SEARCH_DATA_TYPES, limit=page_size, offset=(page - 1) * page_size
+            )
+            if foods or backend == 'local':
+                return foods, next_search_cursor(cursor_query, 'local', page, page_size, foods)
+        except DatabaseError as e:
+            logging.error(f"Local food search failed, falling back to USDA: {str(e)}")
+    return None
+
+def search_food_page(query, backend, page, page_size, cursor_query):
+    """Serve one page of search_foods results; cursors are bound to cursor_query"""
+    data_types = SEARCH_DATA_TYPES
+
+    local_page = search_local_page(query, backend, page, page_size, cursor_query)
+    if local_page is not None:
+        return search_page_response(*local_page)
+
+    if not settings.USDA_API_KEY:
+        return Response(
+            {'error': 'USDA API key not configured. Please set the USDA_API_KEY environment variable.'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    
+    try:
+        key = search_cache_key(query, data_types, page, page_size)
+        foods = search_cache.get_or_set(
+            key,
+            lambda: search_usda_foods(query, data_types, page, page_size)
+        )
+        cursor = next_search_cursor(cursor_query, 'usda', page, page_size, foods)
+        if cursor:
+            prefetch_search_page(query, data_types, page + 1, page_size)
+        return search_page_response(foods, cursor)
+    except (requests.exceptions.RequestException, SharedCallFailed) as e:
         return Response(
             {'error': f'Error searching foods: {str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -328,65 +575,103 @@ def search_foods(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+def parse_food_entry_text(field, value):
+    """Check a text field of a food entry against its column and, for meal_type, its choices"""
+    if not isinstance(value, str):
+        raise ValueError(f'{field} must be a string')
+    max_length = FoodEntry._meta.get_field(field).max_length
+    if len(value) > max_length:
+        raise ValueError(f'{field} must be at most {max_length} characters')
+    if field == 'meal_type' and value not in dict(FoodEntry.MEAL_TYPE_CHOICES):
+        raise ValueError(f"meal_type must be one of {', '.join(dict(FoodEntry.MEAL_TYPE_CHOICES))}")
+    return value
+
+def parse_food_entry_amount(field, value):
+    """Convert a serving amount, rejecting NaN, infinities and negative numbers.
+
+    float() accepts "NaN" and "Infinity", and one such entry would poison its day's summary row.
+    """
+    amount = float(value)
+    if not math.isfinite(amount) or amount < 0:
+        raise ValueError(f'{field} must be a finite, non-negative number')
+    return amount
+
+def parse_food_entry_data(data):
+    """Validate and convert the fields of a food entry request"""
+    food_name = data.get('food_name')
+    return {
+        'fdc_id': data.get('fdc_id'),
+        # Without a name the entry is named after the USDA food
+        'food_name': parse_food_entry_text('food_name', food_name) if food_name is not None else None,
+        'meal_type': parse_food_entry_text('meal_type', data.get('meal_type', 'Lunch')),
+        'number_of_servings': parse_food_entry_amount('number_of_servings', data.get('number_of_servings', 1.0)),
+        'serving_size': parse_food_entry_amount('serving_size', data.get('serving_size', 100.0)),
+        'serving_size_unit': parse_food_entry_text('serving_size_unit', data.get('serving_size_unit', 'g')),
+        'entry_date': datetime.strptime(
+            data.get('entry_date', timezone.now().date().isoformat()),
+            '%Y-%m-%d'
+        ).date(),
+    }
+
+def build_food_entry(entry_data, food_details):
+    """An unsaved food entry from parsed request data and USDA food details"""
+    return FoodEntry(
+        food_name=entry_data['food_name'] or food_details['name'],
+        fdc_id=entry_data['fdc_id'],
+        meal_type=entry_data['meal_type'],
+        number_of_servings=entry_data['number_of_servings'],
+        serving_size=entry_data['serving_size'],
+        serving_size_unit=entry_data['serving_size_unit'],
+        calories=food_details['nutrients']['calories'],
+        protein=food_details['nutrients']['protein'],
+        fat=food_details['nutrients']['fat'],
+        carbs=food_details['nutrients']['carbs'],
+        entry_date=entry_data['entry_date'],
+        client_id=entry_data.get('client_id')
+    )
+
+def save_food_entry(user, entry_data, food_details):
+    """Create a food entry from parsed request data and USDA food details"""
+    return create_food_entries(user, [build_food_entry(entry_data, food_details)])[0]
+
+def created_food_entry_data(food_entry):
+    """Response body for a newly created food entry, with totals for the serving size"""
+    return {**food_entry_totals_data(food_entry), 'message': 'Food entry created successfully!'}
+
+def food_entry_totals_data(food_entry):
+    """A food entry with its nutrients totalled for the serving size"""
+    return {
+        'id': food_entry.id,
+        'food_name': food_entry.food_name,
+        'meal_type': food_entry.meal_type,
+        'number_of_servings': food_entry.number_of_servings,
+        'serving_size': food_entry.serving_size,
+        'serving_size_unit': food_entry.serving_size_unit,
+        'calories': food_entry.total_calories,
+        'protein': food_entry.total_protein,
+        'fat': food_entry.total_fat,
+        'carbs': food_entry.total_carbs,
+        'entry_date': food_entry.entry_date.isoformat()
+    }
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_food_entry(request):
     """Create a new food entry using USDA food data"""
     try:
-        data = request.data
-        fdc_id = data.get('fdc_id')
-        food_name = data.get('food_name')
-        meal_type = data.get('meal_type', 'Lunch')
-        number_of_servings = float(data.get('number_of_servings', 1.0))
-        serving_size = float(data.get('serving_size', 100.0))
-        serving_size_unit = data.get('serving_size_unit', 'g')
-        entry_date = datetime.strptime(
-            data.get('entry_date', timezone.now().date().isoformat()),
-            '%Y-%m-%d'
-        ).date()
+        entry_data = parse_food_entry_data(request.data)
 
         # Get food details from USDA API
-        food_details = get_food_details(fdc_id)
+        food_details = get_food_details(entry_data['fdc_id'])
         if not food_details:
             return Response(
                 {'error': 'Could not fetch food details'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
         
-        # Create food entry
-        food_entry = FoodEntry.objects.create(
-            user=request.user,
-            food_name=food_name or food_details['name'],
-            fdc_id=fdc_id,
-            meal_type=meal_type,
-            number_of_servings=number_of_servings,
-            serving_size=serving_size,
-            serving_size_unit=serving_size_unit,
-            calories=food_details['nutrients']['calories'],
-            protein=food_details['nutrients']['protein'],
-            fat=food_details['nutrients']['fat'],
-            carbs=food_details['nutrients']['carbs'],
-            entry_date=entry_date
-        )
-        
-        # Calculate total nutrients based on serving size
-        total_nutrients = food_entry.get_total_nutrients()
-        
-        return Response({
-            'id': food_entry.id,
-            'food_name': food_entry.food_name,
-            'meal_type': food_entry.meal_type,
-            'number_of_servings': food_entry.number_of_servings,
-            'serving_size': food_entry.serving_size,
-            'serving_size_unit': food_entry.serving_size_unit,
-            'calories': total_nutrients['calories'],
-            'protein': total_nutrients['protein'],
-            'fat': total_nutrients['fat'],
-            'carbs': total_nutrients['carbs'],
-            'entry_date': food_entry.entry_date.isoformat(),
-            'message': 'Food entry created successfully!'
-        }, status=status.HTTP_201_CREATED)
-    except ValueError as e:
+        food_entry = save_food_entry(request.user, entry_data, food_details)
+        return Response(created_food_entry_data(food_entry), status=status.HTTP_201_CREATED)
+    except (ValueError, TypeError) as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logging.error(f"Error creating food entry: {e}")
@@ -395,10 +680,135 @@ def create_food_entry(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def create_food_entries_bulk(request):
+    """Create several food entries, e.g. a whole meal, in one transaction.
+
+    Food details for every fdc_id are looked up in one batch. Either all entries are created
+    or, if any is invalid or its food cannot be found, none are.
+    """
+    items = request.data.get('entries') if isinstance(request.data, dict) else None
+    if not isinstance(items, list) or not items:
+        return Response({'error': 'entries must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > settings.FOOD_ENTRIES_BULK_MAX:
+        return Response(
+            {'error': f'At most {settings.FOOD_ENTRIES_BULK_MAX} entries can be created at once'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    entries_data = []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError('entry must be an object')
+            entry_data = parse_food_entry_data(item)
+            if not str(entry_data['fdc_id'] or '').isdigit():
+                raise ValueError('fdc_id must be numeric')
+            entry_data['fdc_id'] = str(entry_data['fdc_id'])
+        except (ValueError, TypeError) as e:
+            return Response({'error': str(e), 'index': index}, status=status.HTTP_400_BAD_REQUEST)
+        entries_data.append(entry_data)
+
+    try:
+        food_details = get_food_details_batch({entry_data['fdc_id'] for entry_data in entries_data})
+        missing = sorted(fdc_id for fdc_id, details in food_details.items() if details is None)
+        if missing:
+            return Response(
+                {'error': 'Could not fetch food details', 'fdc_ids': missing},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        food_entries = create_food_entries(request.user, [
+            build_food_entry(entry_data, food_details[entry_data['fdc_id']])
+            for entry_data in entries_data
+        ])
+    except Exception as e:
+        logging.error(f"Error creating {len(entries_data)} food entries: {e}")
+        return Response(
+            {'error': 'An error occurred while creating the food entries'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    entries = [food_entry_totals_data(food_entry) for food_entry in food_entries]
+    return Response({
+        'entries': entries,
+        'totals': {
+            nutrient: sum(entry[nutrient] for entry in entries)
+            for nutrient in FoodEntry.NUTRIENT_FIELDS
+        },
+        'message': f'{len(entries)} food entries created successfully!'
+    }, status=status.HTTP_201_CREATED)
+
+# Entries are paged with a keyset cursor over (-entry_date, -created_at, -id), so a page
+# costs the same however much history precedes it
+FOOD_ENTRIES_CURSOR_SALT = 'users.food-entries-cursor'
+DEFAULT_FOOD_ENTRIES_LIMIT = 100
+MAX_FOOD_ENTRIES_LIMIT = 500
+FOOD_ENTRY_FIELDS = (
+    'id', 'food_name', 'meal_type', 'number_of_servings', 'serving_size', 'serving_size_unit',
+    'entry_date', 'calories', 'protein', 'fat', 'carbs', *FoodEntry.TOTAL_NUTRIENT_FIELDS,
+)
+
+def food_entries_cursor(entry):
+    """Opaque cursor pointing just past entry"""
+    return signing.dumps(
+        [entry['entry_date'].isoformat(), entry['created_at'].isoformat(), entry['id']],
+        salt=FOOD_ENTRIES_CURSOR_SALT
+    )
+
+def food_entries_after(entries, cursor):
+    """Filter entries to those that come after the cursor in diary order"""
+    try:
+        entry_date, created_at, entry_id = signing.loads(cursor, salt=FOOD_ENTRIES_CURSOR_SALT)
+        entry_date = datetime.fromisoformat(entry_date).date()
+        created_at = datetime.fromisoformat(created_at)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+    # The redundant entry_date bound lets the index scan start at the cursor's day
+    return entries.filter(entry_date__lte=entry_date).filter(
+        Q(entry_date__lt=entry_date)
+        | Q(entry_date=entry_date, created_at__lt=created_at)
+        | Q(entry_date=entry_date, created_at=created_at, id__lt=entry_id)
+    )
+
+# Bump whenever the body of a diary read changes shape, so ETags cached by clients before
+# the change stop matching and they fetch the new fields
+FOOD_DIARY_ETAG_FORMAT = 'v2'
+
+# Diary reads carry an ETag derived from the user's FoodDiaryVersion, which every write to
+# their entries bumps; a refresh with nothing changed is answered 304 after one primary key
+# lookup, without running the entry or summary query
+def food_diary_etag(request):
+    """ETag for a diary read: response format, the user's version and a hash of the request.
+
+    The version is read before the data, so a response is never tagged with a version newer
+    than its contents; a write landing in between costs the client one more full response.
+    """
+    version = FoodDiaryVersion.objects.filter(user=request.user).values_list('version', flat=True).first() or 0
+    request_key = f"{request.get_full_path()}|{request.headers.get('Accept', '')}"
+    request_hash = hashlib.sha1(request_key.encode()).hexdigest()[:16]
+    return f'W/"{FOOD_DIARY_ETAG_FORMAT}-{request.user.id}-{version}-{request_hash}"'
+
+def tag_food_diary_response(response, etag):
+    response['ETag'] = etag
+    # Clients may keep the response but must revalidate it before using it again
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+def food_diary_not_modified(request, etag):
+    """A 304 response if the request's If-None-Match already has etag, else None"""
+    response = get_conditional_response(request, etag=etag)
+    return response and tag_food_diary_response(response, etag)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_food_entries(request):
-    """Get food entries for the authenticated user with optional date filtering."""
+    """Get food entries for the authenticated user with optional date filtering.
+
+    Entries are returned newest first, at most `limit` at a time; the cursor for the next
+    page is in the X-Next-Cursor header.
+    """
     try:
         date_str = request.query_params.get('date')
         if date_str:
@@ -406,52 +816,262 @@ def get_food_entries(request):
             entries = FoodEntry.objects.filter(user=request.user, entry_date=date)
         else:
             entries = FoodEntry.objects.filter(user=request.user)
-
-        entries_data = [{
-            'id': entry.id,
-            'food_name': entry.food_name,
-            'meal_type': entry.meal_type,
-            'number_of_servings': entry.number_of_servings,
-            'serving_size': entry.serving_size,
-            'serving_size_unit': entry.serving_size_unit,
-            'entry_date': entry.entry_date.isoformat(),
-            'calories': entry.calories,
-            'protein': entry.protein,
-            'fat': entry.fat,
-            'carbs': entry.carbs
-        } for entry in entries]
-
-        return Response(entries_data)
     except ValueError as e:
         return Response({
             'error': f'Invalid date format: {str(e)}'
         }, status=status.HTTP_400_BAD_REQUEST)
 
+    try:
+        limit = int(request.query_params.get('limit', DEFAULT_FOOD_ENTRIES_LIMIT))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= limit <= MAX_FOOD_ENTRIES_LIMIT:
+        return Response(
+            {'error': f'limit must be between 1 and {MAX_FOOD_ENTRIES_LIMIT}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        try:
+            entries = food_entries_after(entries, cursor)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    etag = food_diary_etag(request)
+    not_modified = food_diary_not_modified(request, etag)
+    if not_modified:
+        return not_modified
+
+    # One extra row tells whether there is a next page
+    page = list(
+        entries.order_by('-entry_date', '-created_at', '-id')
+        .values(*FOOD_ENTRY_FIELDS, 'created_at')[:limit + 1]
+    )
+    next_cursor = food_entries_cursor(page[limit - 1]) if len(page) > limit else None
+
+    entries_data = []
+    for entry in page[:limit]:
+        del entry['created_at']
+        entry['entry_date'] = entry['entry_date'].isoformat()
+        entries_data.append(entry)
+
+    response = Response(entries_data)
+    if next_cursor:
+        response['X-Next-Cursor'] = next_cursor
+    return tag_food_diary_response(response, etag)
+
+def parse_date_range(params, max_days=None):
+    """Read the start and end dates of a range request, at most max_days apart
+    (FOOD_ENTRIES_RANGE_MAX_DAYS by default)"""
+    max_days = max_days or settings.FOOD_ENTRIES_RANGE_MAX_DAYS
+    try:
+        start = datetime.strptime(params.get('start', ''), '%Y-%m-%d').date()
+        end = datetime.strptime(params.get('end', ''), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError('start and end must be dates in YYYY-MM-DD format')
+    if end < start:
+        raise ValueError('end must not be before start')
+    if (end - start).days + 1 > max_days:
+        raise ValueError(f'A range may span at most {max_days} days')
+    return start, end
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_food_entries_range(request):
+    """Get the authenticated user's food entries from start to end, grouped by date.
+
+    Every date in the range is present, with an empty list when nothing was logged, so
+    clients can tell an empty day from one they have not loaded.
+    """
+    try:
+        start, end = parse_date_range(request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    etag = food_diary_etag(request)
+    not_modified = food_diary_not_modified(request, etag)
+    if not_modified:
+        return not_modified
+
+    days = {
+        (start + timedelta(days=offset)).isoformat(): []
+        for offset in range((end - start).days + 1)
+    }
+    entries = (
+        FoodEntry.objects.filter(user=request.user, entry_date__range=(start, end))
+        .order_by('-entry_date', '-created_at', '-id')
+        .values(*FOOD_ENTRY_FIELDS)
+    )
+    for entry in entries:
+        entry['entry_date'] = entry['entry_date'].isoformat()
+        days[entry['entry_date']].append(entry)
+
+    return tag_food_diary_response(Response({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'days': days
+    }), etag)
+
+def nutrition_summary_data(summaries):
+    """Shape one day's DailyNutritionSummary rows into day totals and per-meal totals"""
+    data = {
+        'entry_count': 0,
+        'totals': dict.fromkeys(FoodEntry.NUTRIENT_FIELDS, 0.0),
+        'meals': {
+            meal_type: dict.fromkeys(FoodEntry.NUTRIENT_FIELDS, 0.0)
+            for meal_type, _ in FoodEntry.MEAL_TYPE_CHOICES
+        }
+    }
+    for summary in summaries:
+        data['entry_count'] += summary['entry_count']
+        for nutrient in FoodEntry.NUTRIENT_FIELDS:
+            data['totals'][nutrient] += summary[nutrient]
+            if summary['meal_type'] in data['meals']:
+                data['meals'][summary['meal_type']][nutrient] = summary[nutrient]
+    return data
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_nutrition_summary(request):
+    """Get the authenticated user's total nutrients for a date, overall and per meal."""
+    try:
+        date = datetime.strptime(request.query_params.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return Response(
+            {'error': 'date must be a date in YYYY-MM-DD format'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    etag = food_diary_etag(request)
+    not_modified = food_diary_not_modified(request, etag)
+    if not_modified:
+        return not_modified
+
+    # At most one maintained row per meal, however many entries the day has
+    summaries = DailyNutritionSummary.objects.filter(user=request.user, date=date).values(
+        'meal_type', 'entry_count', *FoodEntry.NUTRIENT_FIELDS
+    )
+    return tag_food_diary_response(
+        Response({'date': date.isoformat(), **nutrition_summary_data(summaries)}), etag
+    )
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_nutrition_summary_range(request):
+    """Get the authenticated user's daily nutrient totals from start to end.
+
+    Every date in the range is present; days with nothing logged have zero totals.
+    """
+    try:
+        start, end = parse_date_range(request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    etag = food_diary_etag(request)
+    not_modified = food_diary_not_modified(request, etag)
+    if not_modified:
+        return not_modified
+
+    summaries_by_date = {}
+    summaries = DailyNutritionSummary.objects.filter(
+        user=request.user, date__range=(start, end)
+    ).values('date', 'meal_type', 'entry_count', *FoodEntry.NUTRIENT_FIELDS)
+    for summary in summaries:
+        summaries_by_date.setdefault(summary['date'], []).append(summary)
+
+    days = {}
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        days[day.isoformat()] = nutrition_summary_data(summaries_by_date.get(day, []))
+    return tag_food_diary_response(
+        Response({'start': start.isoformat(), 'end': end.isoformat(), 'days': days}), etag
+    )
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_nutrition_trends(request):
+    """Get the authenticated user's nutrient totals and rolling averages per day, week or month.
+
+    `bucket` is the finest grouping wanted (default day); ranges that would give more than
+    FOOD_TRENDS_MAX_POINTS points are grouped more coarsely, and the response says which
+    bucket was used. `window` is how many buckets the rolling average covers.
+    """
+    try:
+        start, end = parse_date_range(request.query_params, settings.FOOD_TRENDS_MAX_DAYS)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    bucket = request.query_params.get('bucket', 'day')
+    if bucket not in TREND_BUCKETS:
+        return Response(
+            {'error': f"bucket must be one of {', '.join(TREND_BUCKETS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    bucket = choose_trend_bucket(start, end, bucket)
+
+    try:
+        window = int(request.query_params.get('window', DEFAULT_TREND_WINDOWS[bucket]))
+    except ValueError:
+        return Response({'error': 'window must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= window <= MAX_TREND_WINDOW:
+        return Response(
+            {'error': f'window must be between 1 and {MAX_TREND_WINDOW}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    etag = food_diary_etag(request)
+    not_modified = food_diary_not_modified(request, etag)
+    if not_modified:
+        return not_modified
+
+    return tag_food_diary_response(Response({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'bucket': bucket,
+        'window': window,
+        'points': nutrition_trends(request.user.id, start, end, bucket, window)
+    }), etag)
+
+def parse_food_entry_changes(data):
+    """Validate and convert the editable fields present in a food entry update request"""
+    changes = {}
+    for field in ('food_name', 'meal_type', 'serving_size_unit'):
+        if field in data:
+            changes[field] = parse_food_entry_text(field, data[field])
+    for field in ('number_of_servings', 'serving_size'):
+        if field in data:
+            changes[field] = parse_food_entry_amount(field, data[field])
+    if 'entry_date' in data:
+        changes['entry_date'] = datetime.strptime(data['entry_date'], '%Y-%m-%d').date()
+    return changes
+
+def parse_bulk_ids(ids):
+    """Check the entry ids of a bulk update or delete request"""
+    if not isinstance(ids, list) or not ids:
+        raise ValueError('ids must be a non-empty list')
+    if len(ids) > settings.FOOD_ENTRIES_BULK_MAX:
+        raise ValueError(f'At most {settings.FOOD_ENTRIES_BULK_MAX} entries can be changed at once')
+    if not all(isinstance(entry_id, int) and not isinstance(entry_id, bool) for entry_id in ids):
+        raise ValueError('ids must be integers')
+    return ids
+
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 def update_food_entry(request, entry_id):
     """Update an existing food entry."""
     try:
-        food_entry = get_object_or_404(FoodEntry, id=entry_id, user=request.user)
         data = request.data
+        with transaction.atomic():
+            food_entry = get_object_or_404(
+                FoodEntry.objects.select_for_update(), id=entry_id, user=request.user
+            )
+            previous = copy.copy(food_entry)
 
-        # Update food_name if changed
-        if 'food_name' in data and data['food_name'] != food_entry.food_name:
-            food_entry.food_name = data['food_name']
-
-        # Update other fields
-        if 'meal_type' in data:
-            food_entry.meal_type = data['meal_type']
-        if 'number_of_servings' in data:
-            food_entry.number_of_servings = float(data['number_of_servings'])
-        if 'serving_size' in data:
-            food_entry.serving_size = float(data['serving_size'])
-        if 'serving_size_unit' in data:
-            food_entry.serving_size_unit = data['serving_size_unit']
-        if 'entry_date' in data:
-            food_entry.entry_date = datetime.strptime(data['entry_date'], '%Y-%m-%d').date()
+            for field, value in parse_food_entry_changes(data).items():
+                setattr(food_entry, field, value)
 
-        food_entry.save()
+            save_food_entry_edit(food_entry, previous)
 
         return Response({
             'id': food_entry.id,
@@ -471,7 +1091,7 @@ def update_food_entry(request, entry_id):
         return Response({
             'error': 'Food entry not found'
         }, status=status.HTTP_404_NOT_FOUND)
-    except (ValueError, KeyError) as e:
+    except (ValueError, TypeError, KeyError) as e:
         return Response({
             'error': f'Invalid data provided: {str(e)}'
         }, status=status.HTTP_400_BAD_REQUEST)
@@ -480,33 +1100,341 @@ def update_food_entry(request, entry_id):
 @permission_classes([IsAuthenticated])
 def delete_food_entry(request, entry_id):
     """Delete a food entry."""
-    try:
-        food_entry = FoodEntry.objects.get(id=entry_id, user=request.user)
-        food_entry.delete()
-        return Response({
-            'message': 'Food entry deleted successfully!'
-        })
-    except FoodEntry.DoesNotExist:
+    if not delete_food_entries(request.user, [entry_id]):
         return Response({
             'error': 'Food entry not found'
         }, status=status.HTTP_404_NOT_FOUND)
+    return Response({
+        'message': 'Food entry deleted successfully!'
+    })
+
+@api_view(['PATCH'])
+@permission_classes([IsAuthenticated])
+def update_food_entries_bulk(request):
+    """Update several food entries with one UPDATE statement.
+
+    Takes {"entries": [{"id": ..., <fields to change>}, ...]} and reports an outcome per id:
+    updated, not_found (no such entry for this user) or invalid (with the error).
+    """
+    items = request.data.get('entries') if isinstance(request.data, dict) else None
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return Response({'error': 'entries must be a list of objects'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        parse_bulk_ids([item.get('id') for item in items])
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    results = {}
+    changes_by_id = {}
+    for item in items:
+        entry_id = item['id']
+        if entry_id in results or entry_id in changes_by_id:
+            results[entry_id] = {'id': entry_id, 'status': 'invalid', 'error': 'Duplicate id'}
+            changes_by_id.pop(entry_id, None)
+            continue
+        try:
+            changes = parse_food_entry_changes(item)
+            if not changes:
+                raise ValueError('No fields to update')
+            changes_by_id[entry_id] = changes
+        except (ValueError, TypeError) as e:
+            results[entry_id] = {'id': entry_id, 'status': 'invalid', 'error': str(e)}
+
+    updated = update_food_entries(request.user, changes_by_id)
+
+    for food_entry in updated:
+        results[food_entry.id] = {'id': food_entry.id, 'status': 'updated'}
+    for entry_id in changes_by_id:
+        results.setdefault(entry_id, {'id': entry_id, 'status': 'not_found'})
+    return Response({'results': [results[entry_id] for entry_id in dict.fromkeys(item['id'] for item in items)]})
+
+@api_view(['DELETE'])
+@permission_classes([IsAuthenticated])
+def delete_food_entries_bulk(request):
+    """Delete several food entries with one DELETE ... RETURNING statement.
+
+    Takes {"ids": [...]} and reports an outcome per id: deleted or not_found.
+    """
+    try:
+        ids = parse_bulk_ids(request.data.get('ids') if isinstance(request.data, dict) else None)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    deleted_ids = delete_food_entries(request.user, ids)
+    return Response({'results': [
+        {'id': entry_id, 'status': 'deleted' if entry_id in deleted_ids else 'not_found'}
+        for entry_id in dict.fromkeys(ids)
+    ]})
+
+# Delta sync: a client holds an opaque token naming the last change it has applied, as a
+# (sync_seq, id) position in the user's merged stream of entry writes and deletions
+FOOD_SYNC_TOKEN_SALT = 'users.food-sync-token'
+DEFAULT_FOOD_SYNC_LIMIT = 500
+MAX_FOOD_SYNC_LIMIT = 1000
+FOOD_SYNC_FIELDS = (*FOOD_ENTRY_FIELDS, 'fdc_id', 'sync_seq', 'updated_at')
+
+def food_sync_token(sync_seq, entry_id, base):
+    """Opaque token for a position in the change stream; base is the version before which
+    deletions are of no interest to the client (it started from a full sync after them)"""
+    return signing.dumps([sync_seq, entry_id, base], salt=FOOD_SYNC_TOKEN_SALT)
+
+def parse_food_sync_token(token):
+    try:
+        sync_seq, entry_id, base = signing.loads(token, salt=FOOD_SYNC_TOKEN_SALT)
+        return int(sync_seq), int(entry_id), int(base)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise ValueError('Invalid sync token')
+
+def food_entry_sync_data(food_entry):
+    """A FoodEntry in the shape /food-entries/changes/ returns"""
+    data = {field: getattr(food_entry, field) for field in FOOD_SYNC_FIELDS}
+    data['entry_date'] = food_entry.entry_date.isoformat()
+    return data
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_food_entry_changes(request):
+    """Get the authenticated user's food entries created, updated or deleted since a sync token.
+
+    Without `since` every entry is returned (a full sync). Pages hold at most `limit` changes;
+    keep requesting with the returned `next` token while `has_more` is true, and store the
+    final token for the next sync. An expired token (its deletions have been pruned) gets
+    410, and the client should do a full sync.
+    """
+    try:
+        limit = int(request.query_params.get('limit', DEFAULT_FOOD_SYNC_LIMIT))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= limit <= MAX_FOOD_SYNC_LIMIT:
+        return Response(
+            {'error': f'limit must be between 1 and {MAX_FOOD_SYNC_LIMIT}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    version, pruned_through = FoodDiaryVersion.objects.filter(user=request.user).values_list(
+        'version', 'pruned_through'
+    ).first() or (0, 0)
+    since = request.query_params.get('since')
+    if since:
+        try:
+            sync_seq, entry_id, base = parse_food_sync_token(since)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if max(sync_seq, base) < pruned_through:
+            return Response(
+                {'error': 'Sync token has expired; sync again without since'},
+                status=status.HTTP_410_GONE
+            )
+    else:
+        # Deletions made before a full sync starts cannot concern the client
+        sync_seq, entry_id, base = 0, 0, version
+
+    # The sync_seq bounds let the index scans start at the token's position. Both reads stop at
+    # the version read above: every write up to it has committed (bump holds the version row
+    # until commit), so the two statements see the same changes in that range even though they
+    # run at different moments. Later writes are picked up by the next sync.
+    entries = (
+        FoodEntry.objects.filter(user=request.user, sync_seq__gte=sync_seq, sync_seq__lte=version)
+        .filter(Q(sync_seq__gt=sync_seq) | Q(sync_seq=sync_seq, id__gt=entry_id))
+        .order_by('sync_seq', 'id')
+        .values(*FOOD_SYNC_FIELDS)[:limit + 1]
+    )
+    tombstones = (
+        FoodEntryTombstone.objects.filter(
+            user=request.user, sync_seq__gte=sync_seq, sync_seq__gt=base, sync_seq__lte=version
+        )
+        .filter(Q(sync_seq__gt=sync_seq) | Q(sync_seq=sync_seq, entry_id__gt=entry_id))
+        .order_by('sync_seq', 'entry_id')
+        .values_list('sync_seq', 'entry_id')[:limit + 1]
+    )
+    changes = list(itertools.islice(
+        heapq.merge(
+            ((entry['sync_seq'], entry['id'], entry) for entry in entries),
+            ((deleted_seq, deleted_id, None) for deleted_seq, deleted_id in tombstones),
+            key=lambda change: change[:2]
+        ),
+        limit + 1
+    ))
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if changes:
+        sync_seq, entry_id = changes[-1][:2]
+
+    entries_data = []
+    deleted = []
+    for _, changed_id, entry in changes:
+        if entry is None:
+            deleted.append(changed_id)
+        else:
+            entry['entry_date'] = entry['entry_date'].isoformat()
+            entries_data.append(entry)
+    return Response({
+        'entries': entries_data,
+        'deleted': deleted,
+        'next': food_sync_token(sync_seq, entry_id, base),
+        'has_more': has_more
+    })
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def push_food_entry_changes(request):
+    """Apply a batch of food entry changes made offline, in one transaction.
+
+    Takes {"changes": [...]} where each change is {"op": "create", "client_id": ..., <fields as
+    for /create/>}, {"op": "update", "id": ..., <fields to change>} or {"op": "delete", "id": ...}.
+    A create whose client_id the user already has is not applied again, so a client may retry a
+    push whose response it lost; it comes back as created, with the existing entry's id.
+    Updates and deletes may include the sync_seq the client last saw for the entry; if the entry
+    has changed since, the change is not applied and comes back as a conflict with the server's
+    copy. One outcome is returned per change, in order.
+    """
+    items = request.data.get('changes') if isinstance(request.data, dict) else None
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        return Response({'error': 'changes must be a non-empty list of objects'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > settings.FOOD_ENTRIES_BULK_MAX:
+        return Response(
+            {'error': f'At most {settings.FOOD_ENTRIES_BULK_MAX} changes can be pushed at once'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    results = []
+    creates = {}  # result index -> parsed entry data
+    client_ids = {}  # client_id of a create -> its result index
+    updates = {}  # entry id -> (result index, field changes, expected sync_seq)
+    deletes = {}  # entry id -> (result index, expected sync_seq)
+    for index, item in enumerate(items):
+        op = item.get('op')
+        result = {'op': op}
+        results.append(result)
+        try:
+            if op == 'create':
+                client_id = result['client_id'] = item.get('client_id')
+                if client_id is not None:
+                    client_id = parse_food_entry_text('client_id', client_id)
+                    if client_id in client_ids:
+                        raise ValueError('Entry created more than once in this batch')
+                    client_ids[client_id] = index
+                entry_data = parse_food_entry_data(item)
+                if not str(entry_data['fdc_id'] or '').isdigit():
+                    raise ValueError('fdc_id must be numeric')
+                entry_data['fdc_id'] = str(entry_data['fdc_id'])
+                entry_data['client_id'] = client_id
+                creates[index] = entry_data
+                continue
+            if op not in ('update', 'delete'):
+                raise ValueError('op must be create, update or delete')
+            entry_id = item.get('id')
+            result['id'] = entry_id
+            if not isinstance(entry_id, int) or isinstance(entry_id, bool):
+                raise ValueError('id must be an integer')
+            if entry_id in updates or entry_id in deletes:
+                raise ValueError('Entry changed more than once in this batch')
+            expected = item.get('sync_seq')
+            if expected is not None and (not isinstance(expected, int) or isinstance(expected, bool)):
+                raise ValueError('sync_seq must be an integer')
+            if op == 'update':
+                changes = parse_food_entry_changes(item)
+                if not changes:
+                    raise ValueError('No fields to update')
+                updates[entry_id] = (index, changes, expected)
+            else:
+                deletes[entry_id] = (index, expected)
+        except (ValueError, TypeError) as e:
+            result.update(status='invalid', error=str(e))
+
+    try:
+        # Creates applied by an earlier attempt at this push are reported as they were then instead
+        # of being made again; a retry racing the original fails on foodentry_user_client_id_uniq
+        replayed = FoodEntry.objects.filter(
+            user=request.user,
+            client_id__in=[client_id for client_id, index in client_ids.items() if index in creates]
+        ).values_list('client_id', 'id', 'sync_seq') if client_ids else []
+        for client_id, entry_id, sync_seq in replayed:
+            index = client_ids[client_id]
+            results[index].update(status='created', id=entry_id, sync_seq=sync_seq)
+            del creates[index]
+
+        food_details = get_food_details_batch({entry_data['fdc_id'] for entry_data in creates.values()})
+        for index, entry_data in list(creates.items()):
+            if food_details[entry_data['fdc_id']] is None:
+                results[index].update(status='invalid', error='Could not fetch food details')
+                del creates[index]
+
+        with transaction.atomic():
+            current = FoodEntry.objects.select_for_update().filter(user=request.user).in_bulk(
+                [*updates, *deletes]
+            ) if updates or deletes else {}
+            for pending in (updates, deletes):
+                for entry_id, (index, *_, expected) in list(pending.items()):
+                    food_entry = current.get(entry_id)
+                    if food_entry is None:
+                        results[index]['status'] = 'not_found'
+                    elif expected is not None and expected != food_entry.sync_seq:
+                        results[index].update(status='conflict', entry=food_entry_sync_data(food_entry))
+                    else:
+                        continue
+                    del pending[entry_id]
+
+            created = create_food_entries(request.user, [
+                build_food_entry(entry_data, food_details[entry_data['fdc_id']])
+                for entry_data in creates.values()
+            ]) if creates else []
+            updated = update_food_entries(
+                request.user, {entry_id: changes for entry_id, (_, changes, _) in updates.items()}
+            ) if updates else []
+            deleted_ids = delete_food_entries(request.user, list(deletes)) if deletes else set()
+    except Exception as e:
+        logging.error(f"Error applying {len(items)} pushed food entry changes: {e}")
+        return Response(
+            {'error': 'An error occurred while applying the changes'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    for index, food_entry in zip(creates, created):
+        results[index].update(status='created', id=food_entry.id, sync_seq=food_entry.sync_seq)
+    for food_entry in updated:
+        results[updates[food_entry.id][0]].update(status='updated', sync_seq=food_entry.sync_seq)
+    for entry_id, (index, _) in deletes.items():
+        results[index]['status'] = 'deleted' if entry_id in deleted_ids else 'not_found'
+    return Response({'results': results})
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def search_food_items(request):
-    """Search for food items by name."""
-    query = request.query_params.get('q', '')
-    food_items = FoodItem.objects.filter(name__icontains=query)
-    
-    items_data = [{
-        'name': item.name,
-        'calories_per_100g': item.calories_per_100g,
-        'carbs_per_100g': item.carbs_per_100g,
-        'fat_per_100g': item.fat_per_100g,
-        'protein_per_100g': item.protein_per_100g
-    } for item in food_items]
-    
-    return Response(items_data)
+    """Search the local food catalog, returning the same shape as search_foods."""
+    query = request.query_params.get('query') or request.query_params.get('q', '')
+    if not query.strip():
+        return Response({'error': 'Query parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 50)), 200))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    corrected = correct_query(query)
+    response = Response(search_local_foods(corrected or query, limit=limit))
+    if corrected:
+        response['X-Did-You-Mean'] = corrected
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def autocomplete_foods(request):
+    """Suggest catalog foods whose words start with the typed prefix."""
+    query = request.query_params.get('query', '')
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 10)), 50))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    suggestions = get_food_index().complete(query, limit=limit)
+    return Response([{'fdc_id': fdc_id, 'name': name} for fdc_id, name in suggestions])
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def autocomplete_stats(request):
+    """Report the size and memory footprint of this worker's autocomplete index"""
+    return Response(get_food_index().stats())
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -529,4 +1457,50 @@ def get_food_details_api(request, fdc_id):
         return Response(
             {'error': f'Unexpected error: {str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def get_food_details_batch_api(request):
+    """API endpoint to get details for several foods at once, keyed by fdc_id"""
+    fdc_ids = request.data.get('fdc_ids') if isinstance(request.data, dict) else None
+    if not isinstance(fdc_ids, list) or not fdc_ids:
+        return Response(
+            {'error': 'fdc_ids must be a non-empty list'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(fdc_ids) > settings.FOOD_DETAILS_BATCH_MAX_IDS:
+        return Response(
+            {'error': f'At most {settings.FOOD_DETAILS_BATCH_MAX_IDS} fdc_ids can be requested at once'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not all(str(fdc_id).isdigit() for fdc_id in fdc_ids):
+        return Response(
+            {'error': 'fdc_ids must be numeric'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        return Response(get_food_details_batch(fdc_ids))
+    except Exception as e:
+        logging.error(f"Unexpected error in get_food_details_batch_api: {str(e)}")
+        return Response(
+            {'error': f'Unexpected error: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def usda_stats(request):
+    """Report this worker's USDA connection pool, request coalescing and refresh statistics"""
+    stats = get_usda_client().pool_stats()
+    # 'saved' counts lookups that were answered without a USDA request of their own
+    stats['coalescing'] = {
+        flight.name: flight.stats()
+        for flight in (details_flight, search_cache.flight)
+    }
+    stats['background_refresh'] = {
+        refresher.name: refresher.stats()
+        for refresher in (details_refresher, search_prefetcher)
+    }
+    return Response(stats)